@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+# find_duplicates and Catalog.unique_citekey against library size: both should
+# stay flat per entry where a pairwise comparison grows with the library
+import os
+import random
+import sys
+import tempfile
+import time
+
+from argparse import ArgumentParser
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from reffer.catalog import Catalog
+from reffer.entry_keys import find_duplicates
+from library_gen import make_entry
+
+def pairwise(entries) -> int:
+    """ What finding duplicates took before: every pair of titles compared """
+    found = 0
+    for i, (_, a_) in enumerate(entries):
+        for _, b_ in entries[i + 1:]:
+            found += a_.title.casefold() == b_.title.casefold()
+    return found
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument('-n', '--entries', type=int, nargs='+'
+                                         , default=[1000, 4000, 16000])
+    parser.add_argument('--pairwise-max', type=int, default=4000
+              , help="skip the pairwise comparison above this many entries")
+    args = parser.parse_args()
+
+    for n in args.entries:
+        rand = random.Random(0)
+        entries = [(f'/library/p{i}.pdf', make_entry(rand, i, 0))
+                                                            for i in range(n)]
+        start = time.perf_counter()
+        groups = find_duplicates(entries)
+        line = (f"{n:>6} entries: find_duplicates "
+                f"{(time.perf_counter() - start) / n * 1e6:6.1f} us/entry "
+                f"({len(groups)} shared keys)")
+        if n <= args.pairwise_max:
+            start = time.perf_counter()
+            pairwise(entries)
+            line += (f"  pairwise {(time.perf_counter() - start) / n * 1e6:8.1f}"
+                     " us/entry")
+        print(line)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            catalog = Catalog(os.path.join(tmp, 'catalog.sqlite3'))
+            for i, (_, bib) in enumerate(entries):
+                path = os.path.join(tmp, f'p{i}.pdf')
+                open(path, 'wb').close()
+                catalog._store(path, os.stat(path), bib)
+            catalog.commit()
+            # the keys autoset_citekey would give new files by these authors
+            bases = [bib.author.split(',')[0].lower() + bib.year
+                                   for _, bib in rand.sample(entries, 200)]
+            start = time.perf_counter()
+            for i, base in enumerate(bases):
+                catalog.unique_citekey(base, os.path.join(tmp, f'new{i}.pdf'))
+            print(f"{'':>15} unique_citekey "
+                  f"{(time.perf_counter() - start) / len(bases) * 1e6:6.1f} "
+                  "us/call")
+            catalog.close()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+# bytes per in-memory BibTeXEntry against the old one-dict-per-entry storage
+import gc
+import random
+import sys
+import tracemalloc
+
+from argparse import ArgumentParser
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from reffer.bibtex_entry import BibTeXEntry
+from bench_parse import make_entry
+
+OPTIONAL_TAGS = ('abstract', 'doi', 'keywords', 'pages', 'volume')
+
+class DictEntry:
+    """ How BibTeXEntry used to store its tags: one instance __dict__ each """
+    def __init__(self, bibdict:dict):
+        for tag, value in bibdict.items():
+            setattr(self, tag, value)
+
+def parse_tags(bibstr:str) -> dict:
+    """ :returns: the tags of bibstr as a dict in the order they appear """
+    entry_dict = {'type': BibTeXEntry.TYPE_RE.match(bibstr).group('type')}
+    citekey_match = BibTeXEntry.CITEKEY_RE.match(bibstr, bibstr.index('{') + 1)
+    entry_dict['citekey'] = citekey_match.group('citekey')
+    pos = citekey_match.end()
+    while name_match := BibTeXEntry.NAME_RE.match(bibstr, pos):
+        value, pos = BibTeXEntry._scan_value(bibstr, name_match.end())
+        entry_dict[name_match.group('name')] = value
+        pos += 1 # the separator
+    return entry_dict
+
+def measure(factory, bibstrs) -> float:
+    """ :returns: bytes held per entry, tag values included """
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    # the tags are parsed afresh, in the order of bibstr, for either kind of
+    # entry so only the storage of the entries themselves differs
+    entries = [factory(parse_tags(bibstr)) for bibstr in bibstrs]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (after - before) / len(entries)
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument('-n', '--entries', type=int, default=100_000)
+    parser.add_argument('-w', '--abstract-words', type=int, default=0)
+    args = parser.parse_args()
+
+    sorted_bibstrs, export_bibstrs = [], []
+    shuffle = random.Random(0).shuffle
+    for i in range(args.entries):
+        bib = make_entry(i, args.abstract_words)
+        for n, tag in enumerate(OPTIONAL_TAGS): # vary the tags like a library
+            if (i >> n) & 1:
+                delattr(bib, tag)
+        sorted_bibstrs.append(repr(bib))
+        tags = list(bib.tags().items())
+        shuffle(tags) # reference managers export tags in no particular order
+        export_bibstrs.append(f'@{bib.type}{{{bib.citekey},'
+                            + ','.join(f'{tag}={{{value}}}' for tag, value in tags)
+                            + '}')
+
+    for order, bibstrs in (('xattr order', sorted_bibstrs)
+                                           , ('export order', export_bibstrs)):
+        for label, factory in (('dict per entry', DictEntry)
+                                                , ('BibTeXEntry', BibTeXEntry)):
+            print(f"{order:>12}, {label:>14}: {measure(factory, bibstrs):7.1f} "
+                                  f"bytes/entry for {args.entries} entries")
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+# micro-benchmark: BibTeXEntry tokenizer against the old TAG_RE parser
+import re
+import sys
+import timeit
+
+from argparse import ArgumentParser
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from reffer.bibtex_entry import BibTeXEntry, FormatError
+
+# the regular expression parser BibTeXEntry.from_str used to be built on
+TAG_RE = re.compile(r'\s*(?P<name>[\w-]+)\s*=\s*([\{\"](?P<braced_text>.*?)'
+                    r'[\}\"]|(?P<number>\d+))\s*(?:,\s*\}|,|\s+\})')
+
+def legacy_from_str(bibstr, pos=0):
+    type_match = BibTeXEntry.TYPE_RE.search(bibstr, pos)
+    if not type_match:
+        return None, pos
+    entry_dict = {'type': type_match.group('type')}
+    citekey_match = BibTeXEntry.CITEKEY_RE.match(bibstr, type_match.end())
+    entry_dict['citekey'] = citekey_match.group('citekey')
+    pos = citekey_match.end()
+    last_letter = ""
+    while tag_match := TAG_RE.match(bibstr, pos):
+        entry_dict[tag_match.group('name')] = tag_match.group('braced_text')\
+                                  if tag_match.group('braced_text') is not None\
+                                  else tag_match.group('number')
+        pos = tag_match.end()
+        last_letter = tag_match.group(0)[-1]
+    if last_letter != '}':
+        raise FormatError(pos)
+    return entry_dict, pos
+
+def legacy_read_entries(bibstr):
+    entry, pos = legacy_from_str(bibstr)
+    while entry:
+        yield entry
+        entry, pos = legacy_from_str(bibstr, pos)
+
+def make_entry(i:int, abstract_words:int) -> BibTeXEntry:
+    return BibTeXEntry({'type': 'article', 'citekey': f'author{i}2020'
+            , 'author': f'Author{i}, A. and Other, B. and Third, C.'
+            , 'title': f'On the {{DNA}} of {{Model {i}}} systems'
+            , 'journal': 'Journal of Synthetic Benchmarks', 'year': '2020'
+            , 'volume': str(i % 50), 'pages': f'{i}--{i + 12}'
+            , 'doi': f'10.1000/bench.{i}', 'keywords': '#bench #parse'
+            , 'abstract': ' '.join(f'word{w % 97}' for w in range(abstract_words))
+            })
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument('-n', '--entries', type=int, default=2000)
+    parser.add_argument('-w', '--abstract-words', type=int, default=200)
+    parser.add_argument('-r', '--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    entries = [make_entry(i, args.abstract_words) for i in range(args.entries)]
+    for label, bibstr in (('xattr (repr)', ''.join(map(repr, entries)))
+                        , ('.bib (str)', '\n\n'.join(map(str, entries)))):
+        legacy = min(timeit.repeat(lambda: list(legacy_read_entries(bibstr))
+                                              , number=1, repeat=args.repeat))
+        current = min(timeit.repeat(
+                            lambda: list(BibTeXEntry.read_entries(bibstr))
+                                              , number=1, repeat=args.repeat))
+        print(f"{label:>13}: {len(bibstr)/1e6:6.2f} MB  TAG_RE {legacy:.3f}s  "
+              f"tokenizer {current:.3f}s  speedup x{legacy/current:.2f}")
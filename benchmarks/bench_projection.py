@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+# from_str and from_xattr parsing every tag against only the tags a query needs
+import os
+import random
+import sys
+import tempfile
+import timeit
+
+from argparse import ArgumentParser
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from xattr import xattr
+
+from reffer.bibtex_entry import BibTeXEntry
+from library_gen import make_entry
+
+# label -> fields argument: stored entries have their tags in sorted order, so
+# journal is found midway and year is the last tag
+PROJECTIONS = {'all': None, 'header': (), 'journal': ('journal',)
+              , 'year': ('year',)}
+
+def best(func, count:int, repeat:int) -> float:
+    """ :returns: microseconds per item of the fastest of repeat runs """
+    return min(timeit.repeat(func, number=1, repeat=repeat)) / count * 1e6
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument('-n', '--entries', type=int, default=2000)
+    parser.add_argument('-w', '--abstract-words', type=int, nargs='+'
+                                                 , default=[0, 120, 1000])
+    parser.add_argument('-r', '--repeat', type=int, default=5)
+    parser.add_argument('--workdir', help="where to write the test files - "
+                    "ext4 may not hold the larger entries, tmpfs can")
+    args = parser.parse_args()
+
+    print(f"{'':>22}" + "".join(f"{label:>10}" for label in PROJECTIONS)
+                                                        + "   (us per entry)")
+    for words in args.abstract_words:
+        rand = random.Random(0)
+        entries = [make_entry(rand, i, words) for i in range(args.entries)]
+        bibstrs = [repr(bib) for bib in entries]
+        line = f"{words:>4} words  from_str  "
+        for fields in PROJECTIONS.values():
+            line += f"{best(lambda: [BibTeXEntry.from_str(s_, fields=fields) for s_ in bibstrs], len(bibstrs), args.repeat):10.1f}"
+        print(line)
+
+        with tempfile.TemporaryDirectory(dir=args.workdir) as tmp:
+            paths = []
+            for i, bib in enumerate(entries):
+                paths.append(path := os.path.join(tmp, f'{i}.pdf'))
+                open(path, 'wb').close()
+                xattr(path).set(BibTeXEntry.XATTR_KEY, bib.encode())
+            line = f"{'':>11}from_xattr"
+            for fields in PROJECTIONS.values():
+                line += f"{best(lambda: [BibTeXEntry.from_xattr(p_, fields=fields) for p_ in paths], len(paths), args.repeat):10.1f}"
+            print(line)
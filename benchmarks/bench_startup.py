@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# startup of one-file tool runs, as shell loops and editor hooks make them:
+# wall time and what `python -X importtime` shows each command importing
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from argparse import ArgumentParser
+from pathlib import Path
+
+BENCHMARKS = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCHMARKS.parent))
+from library_gen import make_library
+
+# name -> (script, or package run with -m, arguments before the file)
+COMMANDS = {
+    'rshow.py -c':      ('rshow.py', ['-c'])
+  , 'reffer show -c':   ('reffer', ['show', '-c'])
+  , 'reffer show -c --no-cache': ('reffer', ['show', '-c', '--no-cache'])
+  , 'rsrch.py -ck':     ('rsrch.py', ['-ck', 'x'])
+  , 'reffer search -ck': ('reffer', ['search', '-ck', 'x'])
+  , 'redit.py -t':      ('redit.py', ['-t', 'note', 'x'])
+  , 'reffer edit -t':   ('reffer', ['edit', '-t', 'note', 'x'])
+}
+# modules a one-file lookup should not need - sqlite3 and json only with the
+# catalog
+WATCHED = ('readline', 'subprocess', 'tempfile', 'textwrap', 'xattr', 'socket'
+          , 'concurrent.futures', 'plistlib', 'cProfile', 'unicodedata'
+          , 'sqlite3', 'json')
+IMPORT_RE = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)')
+
+def imports(stderr:str):
+    """ :returns: tuple ({module: cumulative microseconds} of the top level
+                  imports in -X importtime output, set of all modules imported)
+    """
+    top, modules = {}, set()
+    for _, cumulative, indent, module in IMPORT_RE.findall(stderr):
+        modules.add(module)
+        if len(indent) == 1:
+            top[module] = int(cumulative)
+    return top, modules
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument('-r', '--repeat', type=int, default=20)
+    parser.add_argument('--root', default=str(BENCHMARKS.parent)
+              , help="directory holding the tools - e.g. a worktree of an "
+              "older commit to compare against")
+    parser.add_argument('--top', type=int, default=5
+              , help="how many of the costliest top level imports to list")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ.update(REFFER_CATALOG=os.path.join(tmp, 'catalog.sqlite3')
+                                                          , REFFER_NO_DAEMON='1')
+        target = str(make_library(Path(tmp) / 'library', 1)[0])
+        for name, (script, arguments) in COMMANDS.items():
+            if not (Path(args.root) / script).exists():
+                continue
+            command = [sys.executable, *(['-m', script] if Path(script).suffix
+                                         != '.py' else [str(Path(args.root)
+                                         / script)]), *arguments, target]
+            run = dict(capture_output=True, cwd=args.root) # cwd: for -m
+            subprocess.run(command, **run) # warms the catalog
+            walls = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                subprocess.run(command, **run)
+                walls.append(time.perf_counter() - start)
+            top, modules = imports(subprocess.run([command[0], '-X'
+                                    , 'importtime', *command[1:]], text=True
+                                    , **run).stderr)
+            print(f"{name:>26}: {statistics.median(walls) * 1e3:6.1f} ms wall"
+                  f", {sum(top.values()) / 1e3:6.1f} ms importing "
+                  f"{len(modules)} modules")
+            print(f"{'':>28}of {', '.join(WATCHED)}: "
+                  f"{', '.join(m_ for m_ in WATCHED if m_ in modules) or '-'}")
+            print(f"{'':>28}costliest: " + ", ".join(f"{module} {us / 1e3:.1f}ms"
+                  for module, us in sorted(top.items()
+                                           , key=lambda item: -item[1])[:args.top]))
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+# walker.walk against the Path.glob traversal the tools used to do
+import sys
+import tempfile
+import timeit
+
+from argparse import ArgumentParser
+from itertools import chain
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from reffer.walker import walk
+
+def make_tree(root:Path, files:int, per_dir:int=500) -> None:
+    """ files empty pdfs, per_dir to a directory, nested two levels deep """
+    for i in range(0, files, per_dir):
+        directory = root / f'group{i // (per_dir * 20)}' / f'dir{i // per_dir}'
+        directory.mkdir(parents=True, exist_ok=True)
+        for j in range(i, min(i + per_dir, files)):
+            (directory / f'paper{j}.pdf').touch()
+        (directory / 'notes.txt').touch() # something not to match
+
+def glob_then_stat(root:str) -> int:
+    """ the old traversal, plus the stat the tools then did for every file """
+    files = chain.from_iterable(tp_.glob('**/*.pdf')
+                               if (tp_ := Path(target)).is_dir() else (tp_,)
+                               for target in (root,))
+    return sum(1 for filepath in files if filepath.stat())
+
+def scandir_walk(root:str) -> int:
+    return sum(1 for libfile in walk((root,), recursive=True) if libfile.st)
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument('-n', '--files', type=int, default=100_000)
+    parser.add_argument('-r', '--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        make_tree(Path(root), args.files)
+        assert glob_then_stat(root) == scandir_walk(root) == args.files
+        for label, func in (('Path.glob + stat', glob_then_stat)
+                                              , ('walker.walk', scandir_walk)):
+            best = min(timeit.repeat(lambda: func(root), number=1
+                                                         , repeat=args.repeat))
+            print(f"{label:>16}: {best:.3f}s for {args.files} files "
+                                    f"({best / args.files * 1e6:.2f} us/file)")
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+# xattr size and from_xattr time: versioned, compressed format against plain
+import os
+import random
+import statistics
+import sys
+import tempfile
+import timeit
+
+from argparse import ArgumentParser
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from xattr import xattr
+
+from reffer.bibtex_entry import BibTeXEntry
+from library_gen import make_entry
+
+EXT4_XATTR_LIMIT = 4096 - 32 # a block, less the header (one attribute only)
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument('-n', '--entries', type=int, default=2000)
+    parser.add_argument('-w', '--abstract-words', type=int, nargs='+'
+                                         , default=[0, 120, 400, 1000])
+    parser.add_argument('-r', '--repeat', type=int, default=5)
+    parser.add_argument('--workdir', help="where to write the test files - "
+                    "ext4 cannot hold the larger plain entries, tmpfs can")
+    args = parser.parse_args()
+
+    for words in args.abstract_words:
+        rand = random.Random(0)
+        entries = [make_entry(rand, i, words) for i in range(args.entries)]
+        sizes = {'plain': [len(repr(bib).encode()) for bib in entries]
+                , 'versioned': [len(bib.encode()) for bib in entries]}
+        line = f"abstract {words:>4} words:"
+        for label, values in sizes.items():
+            too_big = sum(size > EXT4_XATTR_LIMIT for size in values)
+            line += (f"  {label} {statistics.mean(values):7.0f} B/entry"
+                     f" ({too_big} over ext4's limit)")
+        print(line)
+
+        with tempfile.TemporaryDirectory(dir=args.workdir) as tmp:
+            times = {}
+            for label, encode in (('plain', lambda bib: repr(bib).encode())
+                                          , ('versioned', BibTeXEntry.encode)):
+                paths = []
+                for i, bib in enumerate(entries):
+                    path = os.path.join(tmp, f'{label}{i}.pdf')
+                    open(path, 'wb').close()
+                    try:
+                        xattr(path).set(BibTeXEntry.XATTR_KEY, encode(bib))
+                    except OSError: # too big for this file system
+                        continue
+                    paths.append(path)
+                times[label] = min(timeit.repeat(lambda: [
+                    BibTeXEntry.from_xattr(path) for path in paths]
+                                        , number=1, repeat=args.repeat)) / len(paths)
+            print(f"{'':>21}  from_xattr: plain {times['plain'] * 1e6:6.1f} us"
+                  f"  versioned {times['versioned'] * 1e6:6.1f} us")
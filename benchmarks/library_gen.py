@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# builds a synthetic library: empty pdfs carrying BibTeX entries and skim notes
+import gzip
+import os
+import plistlib
+import random
+import sys
+
+from argparse import ArgumentParser
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from xattr import xattr
+
+from reffer.bibtex_entry import BibTeXEntry
+from reffer.skim_notes import NOTES_KEY, TEXT_NOTES_KEY, render_text
+
+WORDS = ('cell', 'protein', 'genome', 'model', 'theory', 'enzyme', 'ribosome'
+        , 'membrane', 'signal', 'pathway', 'expression', 'structure', 'dynamics'
+        , 'evolution', 'network', 'binding', 'kinetics', 'assay', 'mutation'
+        , 'transcription', 'the', 'of', 'and', 'in', 'a', 'with', 'for', 'by')
+HASHTAGS = tuple(f'#{word}' for word in WORDS[:20]) + ('#todo', '#review:2'
+                                                    , '#cite(intro)', '#method')
+TYPES = ('article', 'article', 'article', 'inproceedings', 'book', 'misc')
+NOTE_TYPES = ('Highlight', 'Note', 'Underline', 'Text')
+
+def make_entry(rand:random.Random, i:int, abstract_words:int) -> BibTeXEntry:
+    """ An entry with the tags, and the variety of tags, of a real library """
+    author = rand.choice(WORDS[:20]).capitalize()
+    year = str(rand.randrange(1950, 2025))
+    tags = {'type': rand.choice(TYPES), 'citekey': f'{author.lower()}{year}{i}'
+           , 'author': f'{author}, A. and Other{i % 97}, B.'
+           , 'title': ' '.join(rand.choices(WORDS, k=rand.randrange(4, 12)))
+                                                                  .capitalize()
+           , 'year': year}
+    optional = {'journal': lambda: f'Journal of {rand.choice(WORDS[:20])}'
+               , 'volume': lambda: str(rand.randrange(1, 200))
+               , 'pages': lambda: f'{(p_ := rand.randrange(1, 900))}--{p_ + 14}'
+               , 'doi': lambda: f'10.{rand.randrange(1000, 9999)}/synth.{i}'
+               , 'keywords': lambda: ' '.join(rand.sample(HASHTAGS, 3))
+               , 'abstract': lambda: ' '.join(rand.choices(WORDS
+                                                           , k=abstract_words))}
+    for tag, value in optional.items():
+        if rand.random() < 0.8:
+            tags[tag] = value()
+    return BibTeXEntry(tags)
+
+def make_notes(rand:random.Random, notes:int, note_words:int) -> list:
+    """ note dictionaries as skim archives them """
+    return [{'type': rand.choice(NOTE_TYPES), 'pageIndex': rand.randrange(40)
+            , 'contents': ' '.join(rand.choices(WORDS + HASHTAGS, k=note_words))}
+                                                          for _ in range(notes)]
+
+def make_library(root, files:int, *, abstract_words=120, notes=4, note_words=30
+                 , text_notes=True, legacy=False, per_dir=500, seed=0) -> list:
+    """ Create files empty pdfs under root, per_dir to a directory
+        :param notes: skim notes per file (a random number up to twice that)
+        :param text_notes: also store the text rendering skim keeps alongside
+                           the notes, which is what the tools read first
+        :param legacy: store entries in the unversioned plain text format
+        :returns: the paths of the pdfs
+    """
+    rand = random.Random(seed)
+    paths = []
+    for i in range(files):
+        directory = Path(root) / f'group{i // (per_dir * 20)}' / f'dir{i // per_dir}'
+        if i % per_dir == 0:
+            directory.mkdir(parents=True, exist_ok=True)
+        path = directory / f'paper{i}.pdf'
+        path.write_bytes(b'%PDF-1.4\n%%EOF\n')
+        x_ = xattr(os.fspath(path))
+        bib = make_entry(rand, i, abstract_words)
+        x_.set(BibTeXEntry.XATTR_KEY
+                             , repr(bib).encode() if legacy else bib.encode())
+        if file_notes := make_notes(rand, rand.randrange(2 * notes + 1)
+                                                                  , note_words):
+            x_.set(NOTES_KEY, gzip.compress(plistlib.dumps(file_notes
+                                          , fmt=plistlib.FMT_BINARY), mtime=0))
+            if text_notes:
+                x_.set(TEXT_NOTES_KEY, plistlib.dumps(render_text(file_notes)
+                                                    , fmt=plistlib.FMT_BINARY))
+        paths.append(path)
+    return paths
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description="fill DIRECTORY with a synthetic library")
+    parser.add_argument('directory')
+    parser.add_argument('-n', '--files', type=int, default=1000)
+    parser.add_argument('-w', '--abstract-words', type=int, default=120)
+    parser.add_argument('--notes', type=int, default=4
+                                  , help="average number of skim notes per file")
+    parser.add_argument('--note-words', type=int, default=30)
+    parser.add_argument('--no-text-notes', action='store_true'
+                          , help="store only the archived notes, not their text")
+    parser.add_argument('--legacy', action='store_true'
+                    , help="store entries in the unversioned plain text format")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    make_library(args.directory, args.files, abstract_words=args.abstract_words
+                 , notes=args.notes, note_words=args.note_words
+                 , text_notes=not args.no_text_notes, legacy=args.legacy
+                 , seed=args.seed)
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+# timed scenarios over synthetic libraries, saved as json to compare releases
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+from argparse import ArgumentParser
+from datetime import datetime, timezone
+from pathlib import Path
+
+BENCHMARKS = Path(__file__).resolve().parent
+REPO = BENCHMARKS.parent
+sys.path.insert(0, str(REPO))
+from reffer.bibtex_entry import BibTeXEntry
+from reffer.skim_notes import _skimnotes_text
+from library_gen import make_library
+
+# whole runs of the tools: name -> (script, arguments before the library)
+TOOL_SCENARIOS = {
+    'rsrch_tag':      ('rsrch.py', ['-r', '-t', 'title', 'protein'])
+  , 'rshow_citekey':  ('rshow.py', ['-r', '-c'])
+  , 'rsrch_notes':    ('rsrch.py', ['-r', '-n', r'binding \w+ kinetics'])
+  , 'rshow_collate':  ('rshow.py', ['-r', '-cht'])
+}
+SKIMNOTES_SAMPLE = 100 # files the skimnotes fallback is timed on
+
+def best_of(func, repeat:int, setup=None) -> float:
+    """ :returns: the fastest of repeat runs of func, after setup if given """
+    times = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+def entry_scenarios(paths, repeat:int) -> dict:
+    """ from_str, str and repr, from_xattr and inject over every file """
+    bibstrs = [repr(BibTeXEntry.from_xattr(path)) for path in paths]
+    dicts = [BibTeXEntry.from_str(bibstr).to_dict() for bibstr in bibstrs]
+    entries = []
+    def fresh_entries(): # str and repr are cached by each entry
+        entries[:] = map(BibTeXEntry, dicts)
+    def serialize():
+        for bib in entries:
+            str(bib), repr(bib)
+    return {
+        'parse': best_of(lambda: [BibTeXEntry.from_str(s_) for s_ in bibstrs]
+                                                                      , repeat)
+      , 'serialize': best_of(serialize, repeat, setup=fresh_entries)
+      , 'from_xattr': best_of(lambda: [BibTeXEntry.from_xattr(p_)
+                                                       for p_ in paths], repeat)
+      , 'inject': best_of(lambda: [bib.inject(p_)
+                                for bib, p_ in zip(entries, paths)], repeat)
+    }
+
+def tool_scenarios(root, catalog:Path, repeat:int) -> dict:
+    """ Each tool run once on an empty catalog (.cold) then repeat times on
+        the catalog that run left behind
+    """
+    results = {}
+    for name, (script, arguments) in TOOL_SCENARIOS.items():
+        command = [sys.executable, str(REPO / script), *arguments, str(root)]
+        def run():
+            subprocess.run(command, stdout=subprocess.DEVNULL
+                                         , stderr=subprocess.DEVNULL, check=True)
+        catalog.unlink(missing_ok=True)
+        results[name + '.cold'] = best_of(run, 1)
+        results[name] = best_of(run, repeat)
+    return results
+
+def run_suite(sizes, repeat:int, workdir=None, **library_options) -> dict:
+    """ :returns: {'meta': ..., 'results': {scenario/files: seconds}} """
+    results = {}
+    for files in sizes:
+        with tempfile.TemporaryDirectory(dir=workdir) as tmp:
+            root, catalog = Path(tmp) / 'library', Path(tmp) / 'catalog.sqlite3'
+            # the catalog must not exist while timing inject, see record_injection
+            os.environ.update(REFFER_CATALOG=str(catalog), REFFER_NO_DAEMON='1'
+                    , PATH=f"{BENCHMARKS / 'stub'}{os.pathsep}{os.environ['PATH']}")
+            start = time.perf_counter()
+            paths = make_library(root, files, **library_options)
+            print(f"generated {files} files in {time.perf_counter() - start:.1f}s"
+                                                              , file=sys.stderr)
+            timings = entry_scenarios(paths, repeat)
+            timings['notes_skimnotes'] = best_of(lambda: [_skimnotes_text(p_)
+                                     for p_ in paths[:SKIMNOTES_SAMPLE]], repeat)
+            timings.update(tool_scenarios(root, catalog, repeat))
+        for scenario, seconds in timings.items():
+            results[f'{scenario}/{files}'] = seconds
+            print(f"{scenario:>22} {files:>7}: {seconds:8.3f}s", file=sys.stderr)
+    return {'meta': metadata(sizes, repeat, library_options), 'results': results}
+
+def metadata(sizes, repeat:int, library_options:dict) -> dict:
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO
+                        , capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {'date': datetime.now(timezone.utc).isoformat(timespec='seconds')
+           , 'commit': commit, 'python': platform.python_version()
+           , 'platform': platform.platform(), 'sizes': list(sizes)
+           , 'repeat': repeat, 'library': library_options}
+
+def compare(baseline:dict, current:dict, threshold:float) -> list:
+    """ Print the scenarios both runs have side by side
+        :returns: the scenarios more than threshold slower in current
+    """
+    regressions = []
+    print(f"{'scenario':>30} {'baseline':>9} {'current':>9}  ratio")
+    for scenario, before in baseline['results'].items():
+        if (after := current['results'].get(scenario)) is None:
+            continue
+        ratio = after / before if before else float('inf')
+        flag = ''
+        if ratio > 1 + threshold:
+            regressions.append(scenario)
+            flag = '  REGRESSION'
+        print(f"{scenario:>30} {before:9.3f} {after:9.3f}  x{ratio:.2f}{flag}")
+    return regressions
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description="time parsing, serializing and whole "
+                            "tool runs on synthetic libraries")
+    parser.add_argument('-n', '--sizes', type=int, nargs='+'
+                                , default=[1_000, 10_000, 100_000], metavar=('N')
+                                , help="library sizes, in files, to time")
+    parser.add_argument('-r', '--repeat', type=int, default=3)
+    parser.add_argument('-w', '--abstract-words', type=int, default=120)
+    parser.add_argument('--notes', type=int, default=4
+                                  , help="average number of skim notes per file")
+    parser.add_argument('--note-words', type=int, default=30)
+    parser.add_argument('--workdir', help="where to generate the libraries - "
+                    "ext4 fits all the xattrs of a file in one block, so large "
+                    "notes need a file system such as tmpfs (/dev/shm)")
+    parser.add_argument('-o', '--output', metavar=('JSON')
+                                             , help="save the results to JSON")
+    parser.add_argument('-c', '--compare', metavar=('BASELINE')
+                          , help="flag scenarios slower than in BASELINE json")
+    parser.add_argument('--current', metavar=('JSON'), help="with --compare, "
+                              "compare the results in JSON instead of a new run")
+    parser.add_argument('-t', '--threshold', type=float, default=0.10
+                              , help="slowdown ratio counted as a regression")
+    args = parser.parse_args()
+
+    if args.current:
+        current = json.loads(Path(args.current).read_text())
+    else:
+        current = run_suite(args.sizes, args.repeat, args.workdir
+                           , abstract_words=args.abstract_words
+                           , notes=args.notes, note_words=args.note_words)
+        if args.output:
+            Path(args.output).write_text(json.dumps(current, indent=2) + '\n')
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text())
+        if regressions := compare(baseline, current, args.threshold):
+            sys.exit(f"{len(regressions)} scenarios slower than the baseline by "
+                                            f"more than {args.threshold:.0%}")
@@ -0,0 +1,7 @@
+#!/usr/bin/env python3
+# `reffer daemon` run from a checkout, see reffer/rdaemon.py
+import sys
+
+if __name__ == '__main__':
+    from reffer.rdaemon import main
+    sys.exit(main())
@@ -0,0 +1,105 @@
+# the reffer command - one entry point for the tools, each imported only when
+# its subcommand runs - and an API for using a library from within python
+import sys
+
+# subcommand: (module, whether rdaemon.py can answer it, summary)
+COMMANDS = {
+    'show': ('rshow', True, "show the BibTeX entries and hashtags of pdfs")
+  , 'search': ('rsrch', True, "search the BibTeX entries and skim notes of pdfs")
+  , 'edit': ('redit', False, "edit the BibTeX entries of pdfs")
+  , 'set': ('rset', False, "attach BibTeX entries to pdfs")
+  , 'daemon': ('rdaemon', False, "keep a library in memory for show and search")
+}
+
+def usage() -> str:
+    return "\n".join(["usage: reffer COMMAND [-h] [options]", "", "commands:"]
+                    + [f"  {command:<8}{summary}"
+                       for command, (_, _, summary) in COMMANDS.items()])
+
+def main(argv=None) -> int:
+    """ Run the tool named by the first of argv on the rest
+        :returns: exit status
+    """
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if not argv or argv[0] in ('-h', '--help'):
+        print(usage(), file=sys.stdout if argv else sys.stderr)
+        return 0 if argv else 2
+    command, argv = argv[0], argv[1:]
+    if command not in COMMANDS:
+        print(usage(), file=sys.stderr)
+        print(f"reffer: error: unknown command '{command}'", file=sys.stderr)
+        return 2
+    module, forwarded, _ = COMMANDS[command]
+    if forwarded:
+        from . import daemon_client
+        if (status := daemon_client.forward(module, argv)) is not None:
+            return status
+    from importlib import import_module
+    return import_module(f'.{module}', __name__).main(argv
+                                                  , prog=f"reffer {command}")
+
+# In-process API: a process that looks up many files keeps one Library - and
+# so one catalog connection and warm caches - instead of running a tool per
+# file. Each function uses the library given, or one shared by all calls.
+
+_library = None
+
+def open_library(*, cache=True):
+    """ :param cache: read entries through the catalog, as the tools do
+                      unless given --no-cache
+        :returns: a library.Library
+    """
+    from .library import Library
+    from .catalog import Catalog
+    return Library(Catalog.default()) if cache else Library()
+
+def _default(library):
+    global _library
+    if library is not None:
+        return library
+    if _library is None:
+        _library = open_library()
+    return _library
+
+def files(targets, *, recursive=False, library=None, **options):
+    """ :param targets: files and directories, as given to the tools
+        :param options: further keyword arguments of walker.walk
+        :yields: walker.LibraryFile objects, usable as paths
+    """
+    return _default(library).walk(targets, recursive=recursive, **options)
+
+def entry(filepath, *, fields=None, library=None):
+    """ :param fields: the tags the caller needs, if not all - the others
+                       are only parsed if asked for, see BibTeXEntry.from_str
+        :returns: the BibTeXEntry attached to filepath or None
+        :raises FormatError: if the attached entry does not parse
+    """
+    return _default(library).entry(filepath, fields)
+
+def notes(filepath, *, library=None) -> str:
+    """ :returns: the skim notes of filepath as text """
+    return _default(library).notes(filepath)
+
+def entries(targets, *, recursive=False, fields=None, library=None
+                                                                , **options):
+    """ :yields: tuple (LibraryFile, BibTeXEntry or None) for each file, see
+                 files() and entry()
+    """
+    library = _default(library)
+    for filepath in files(targets, recursive=recursive, library=library
+                                                                , **options):
+        yield filepath, library.entry(filepath, fields)
+
+def search(query:str, targets, *, recursive=False, library=None, **options):
+    """ :param query: a query as taken by `reffer search -q`
+        :yields: the LibraryFile of each file matching query, see files()
+        :raises query.QueryError: if query is not well formed
+    """
+    from .query import Candidate, parse
+    library = _default(library)
+    plan = parse(query)
+    fields = plan.fields()
+    for filepath in files(targets, recursive=recursive, library=library
+                                                                , **options):
+        if plan.test(Candidate(filepath, library, fields)):
+            yield filepath
@@ -0,0 +1,6 @@
+# `python -m reffer`, the reffer command without installing it
+import sys
+
+from . import main
+
+sys.exit(main())
@@ -0,0 +1,509 @@
+# written by Nathan Sinclair
+import codecs
+import re
+import sys
+import zlib
+
+from . import stats
+
+from pathlib import Path
+import errno
+
+class FormatError(ValueError): pass
+
+class _Layout:
+    """ The sorted tag names of an entry, shared by every entry with exactly
+        those tags so that each entry only has to hold a tuple of values
+    """
+    __slots__ = ('tags', 'index', '_successors')
+    _all = {} # tuple of tags -> _Layout
+
+    def __init__(self, tags:tuple):
+        self.tags = tags
+        self.index = {tag: i for i, tag in enumerate(tags)}
+        self._successors = {} # (tag, added?) -> _Layout
+
+    @classmethod
+    def of(cls, tags) -> '_Layout':
+        tags = tuple(sorted(map(sys.intern, tags)))
+        if (layout := cls._all.get(tags)) is None:
+            layout = cls._all.setdefault(tags, cls(tags))
+        return layout
+
+    def adding(self, tag:str) -> '_Layout':
+        if (layout := self._successors.get((tag, True))) is None:
+            layout = self._successors[tag, True] = _Layout.of(self.tags+(tag,))
+        return layout
+
+    def removing(self, tag:str) -> '_Layout':
+        if (layout := self._successors.get((tag, False))) is None:
+            layout = self._successors[tag, False] = _Layout.of(
+                                              t_ for t_ in self.tags if t_ != tag)
+        return layout
+
+class BibTeXEntry:
+    """ A BibTeX entry whose tags are read and written as attributes
+        Only type and citekey are real attributes, the tags are kept as a tuple
+        of values against a _Layout shared with other entries. Serializations
+        are cached until the entry is next modified.
+        An entry parsed for some fields only (see from_str) holds the source
+        text in _pending until anything else is asked of it.
+    """
+    __slots__ = ('type', 'citekey', '_layout', '_values', '_str', '_repr'
+                , '_pending')
+    XATTR_KEY = 'sinclair_reffer_bibtex_entry'
+    # xattr format: MAGIC, a version byte and a codec byte, then repr(entry)
+    # as utf-8, compressed by the codec. Entries written before there was a
+    # format are the bare utf-8, which always starts with '@'
+    XATTR_MAGIC = b'RFX'
+    XATTR_VERSION = 1
+    XATTR_PLAIN, XATTR_ZLIB = b'P', b'Z'
+    COMPRESS_ABOVE = 512 # bytes - zlib saves too little on shorter entries
+    ENTRY_TEMPLATE = '@article \n@book \n@inbook \n@booklet \n@incollection \n@inproceedings \n@mastersthesis \n@manual \n@misc \n@phdthesis{,\n\tauthor = {},\n\tdoi = {},\n\tedition = {},\n\teditor = {},\n\tjournal = {},\n\tkeywords = {},\n\tnumber = {},\n\tpages = {1--2},\n\tpublisher = {},\n\tschool = {},\n\ttitle = {},\n\turl = {},\n\tvolume = {},\n\tyear = {}\n}'
+
+    # type string stored in group('type')
+    TYPE_RE = re.compile(r'@(?P<type>\w+)\s*\{')
+    # citekey string stored in group('citekey')
+    CITEKEY_RE = re.compile(r'\s*(?P<citekey>[-_:\w]*)\s*,')
+    CITEKEY_PREFIX_RE = re.compile(r'\s*[-_:\w]*\s*') # to locate errors
+    # the tokenizer below matches these one token at a time - none of them can
+    # backtrack, so scanning an entry is linear in its length
+    NAME_RE = re.compile(r'\s*(?P<name>[\w-]+)\s*=\s*')
+    NUMBER_RE = re.compile(r'\d+')
+    BRACE_RE = re.compile(r'[{}]')
+    QUOTE_RE = re.compile(r'[{}"]')
+    # group(1) is ',' if another tag may follow or '}' at the end of the entry
+    SEPARATOR_RE = re.compile(r'\s*([,}])')
+    CLOSE_RE = re.compile(r'\s*\}')
+    SPACE_RE = re.compile(r'\s*')
+    # tags whose values recur across a library: one copy is kept of each value
+    SHARED_VALUE_TAGS = frozenset({'address', 'booktitle', 'edition', 'journal'
+                                  , 'month', 'publisher', 'school', 'series'
+                                  , 'volume', 'year'})
+    # read_entries gives up on an entry that has not ended after this many chars
+    MAX_ENTRY_SIZE = 1 << 24
+    # the entry's own fields. A tag of the same name (type is a standard BibTeX
+    # field) is an ordinary tag but for its key in the dicts of __init__ and
+    # to_dict, which is the name with SHADOWED_PREFIX - never part of a tag name
+    OWN_FIELDS = ('type', 'citekey')
+    SHADOWED_PREFIX = '@'
+
+    def __init__(self, bibdict:dict):
+        if not {'citekey', 'type'} <= bibdict.keys():
+            raise FormatError()
+        object.__setattr__(self, 'type', sys.intern(bibdict['type']))
+        object.__setattr__(self, 'citekey', bibdict['citekey'])
+        tags = {key.removeprefix(self.SHADOWED_PREFIX): value
+                for key, value in bibdict.items() if key not in self.OWN_FIELDS}
+        layout = _Layout.of(tags)
+        object.__setattr__(self, '_layout', layout)
+        object.__setattr__(self, '_values', tuple(self._share(tag, tags[tag])
+                                                      for tag in layout.tags))
+        object.__setattr__(self, '_pending', None) # (bibstr, pos) if partial
+        self._invalidate()
+
+    @classmethod
+    def _share(cls, tag:str, value):
+        return sys.intern(value) if tag in cls.SHARED_VALUE_TAGS \
+                                           and type(value) is str else value
+
+    def __getattr__(self, name): # only called for names that are not slots
+        if not name.startswith('_'):
+            try:
+                return self._values[self._layout.index[name]]
+            except KeyError:
+                if self._pending is not None:
+                    self._complete()
+                    return getattr(self, name)
+        error = AttributeError(f"{type(self).__name__!r} object has no tag "
+                                                                    f"{name!r}")
+        error.name = name # the keyword is python 3.10+
+        raise error
+
+    def __setattr__(self, name, value):
+        if name in self.__slots__:
+            object.__setattr__(self, name, value)
+            if not name.startswith('_'):
+                self._invalidate()
+        else:
+            self._set_tag(name, value)
+
+    def __delattr__(self, name):
+        self._complete()
+        if name not in self._layout.index:
+            raise AttributeError(name)
+        self._remove_tag(name)
+
+    def get(self, tag:str, default=None):
+        """ Read a tag named by the user, which getattr may find a method or
+            constant of the class for instead
+            :returns: the value of tag (type and citekey being the entry's own)
+                      or default if the entry has no such tag
+        """
+        if tag in self.OWN_FIELDS:
+            return getattr(self, tag)
+        if (i := self._layout.index.get(tag)) is None \
+                                                and self._pending is not None:
+            self._complete()
+            i = self._layout.index.get(tag)
+        return default if i is None else self._values[i]
+
+    def set(self, tag:str, value) -> None:
+        """ Write a tag named by the user - see get
+            :param value: None to remove the tag. type and citekey, the entry's
+                          own, are set but never removed
+        """
+        if tag in self.OWN_FIELDS:
+            if value is not None:
+                setattr(self, tag, value)
+        elif value is not None:
+            self._set_tag(tag, value)
+        else:
+            self._complete()
+            if tag in self._layout.index:
+                self._remove_tag(tag)
+
+    def _set_tag(self, tag:str, value) -> None:
+        self._complete()
+        value, values = self._share(tag, value), self._values
+        if (i := self._layout.index.get(tag)) is not None:
+            object.__setattr__(self, '_values', values[:i]+(value,)+values[i+1:])
+        else:
+            layout = self._layout.adding(tag)
+            i = layout.index[tag]
+            object.__setattr__(self, '_values', values[:i]+(value,)+values[i:])
+            object.__setattr__(self, '_layout', layout)
+        self._invalidate()
+
+    def _remove_tag(self, tag:str) -> None:
+        i, values = self._layout.index[tag], self._values
+        object.__setattr__(self, '_values', values[:i] + values[i+1:])
+        object.__setattr__(self, '_layout', self._layout.removing(tag))
+        self._invalidate()
+
+    def __reduce__(self): # copy and pickle through the constructor
+        return type(self), (self.to_dict(),)
+
+    def _invalidate(self) -> None:
+        object.__setattr__(self, '_str', None)
+        object.__setattr__(self, '_repr', None)
+
+    def _complete(self) -> None:
+        """ Parse the tags a partial parse left in _pending
+            :raises FormatError: if they do not parse
+        """
+        if self._pending is None:
+            return
+        full = type(self).from_str(*self._pending)
+        object.__setattr__(self, '_layout', full._layout)
+        object.__setattr__(self, '_values', full._values)
+        object.__setattr__(self, '_pending', None)
+
+    def tags(self) -> dict:
+        """ :returns: {tag: value} for every tag but type and citekey """
+        self._complete()
+        return dict(zip(self._layout.tags, self._values))
+
+    def to_dict(self) -> dict:
+        """ :returns: a dict from which BibTeXEntry() rebuilds this entry """
+        return {'type': self.type, 'citekey': self.citekey
+               , **{self.SHADOWED_PREFIX + tag if tag in self.OWN_FIELDS else tag
+                                     : value for tag, value in self.tags().items()}}
+
+    @classmethod # Alternative constructor
+    def from_str(cls, bibstr:str, pos=0, *, return_end=False, fields=None):
+        """ Parse the next bibtex entry in bibstr starting at/after pos
+            Of a tag given more than once the first value counts, as in BibTeX.
+            A type or citekey tag is kept apart from the entry's own, see
+            OWN_FIELDS
+            :param bibstr: a string expected to contain a bibtex entry
+            :param pos: the position in bibstr to start searching for the entry
+            :param fields: the tags the caller needs, if not all - parsing stops
+                           once they have all been found and the rest is parsed
+                           (and any error in it raised) when first needed.
+                           Ignored with return_end, which needs the whole entry
+            :returns: a BibTexEntry OR a tuple (BibTeXEntry, endpos)
+            :raises FormatError: arg[0] == position of the offending character
+                                 (len(bibstr) if the entry is incomplete),
+                                 arg[1] == description of what was expected
+        """
+        type_match = cls.TYPE_RE.search(bibstr, pos)
+        if not type_match:
+            return None if not return_end else (None, pos)
+        # tags still to be found before parsing can stop, -1 for all of them
+        wanted = -1
+        if fields is not None and not return_end:
+            fields = frozenset(fields).difference(cls.OWN_FIELDS)
+            wanted = len(fields)
+        start = type_match.start()
+        entry_dict = {'type':type_match.group('type')}
+        pos = type_match.end()
+
+        citekey_match = cls.CITEKEY_RE.match(bibstr, pos)
+        if not citekey_match:
+            raise FormatError(cls.CITEKEY_PREFIX_RE.match(bibstr, pos).end()
+                                                    , "expected citekey and ','")
+        entry_dict['citekey'] = citekey_match.group('citekey')
+        pos = citekey_match.end()
+
+        # after the citekey and after each ',': either a tag or the closing '}'
+        while not (close_match := cls.CLOSE_RE.match(bibstr, pos)):
+            if wanted == 0:
+                return cls._partial(entry_dict, bibstr, start)
+            if not (name_match := cls.NAME_RE.match(bibstr, pos)):
+                raise FormatError(cls._skip_space(bibstr, pos)
+                                                  , "expected tag name or '}'")
+            value, pos = cls._scan_value(bibstr, name_match.end())
+            name = name_match.group('name')
+            key = cls.SHADOWED_PREFIX + name if name in cls.OWN_FIELDS else name
+            # of repeated tags the first counts, as in BibTeX - then a partial
+            # parse, which stops at the first, gives what a full one does
+            if key not in entry_dict:
+                entry_dict[key] = value
+                if wanted > 0 and name in fields:
+                    wanted -= 1
+
+            if not (separator := cls.SEPARATOR_RE.match(bibstr, pos)):
+                raise FormatError(cls._skip_space(bibstr, pos)
+                                                      , "expected ',' or '}'")
+            pos = separator.end()
+            if separator.group(1) == '}':
+                break
+        else:
+            pos = close_match.end()
+
+        return cls(entry_dict) if not return_end else (cls(entry_dict), pos)
+
+    @classmethod
+    def _partial(cls, entry_dict:dict, bibstr:str, start:int):
+        """ :returns: an entry of the tags in entry_dict that parses the rest
+                      of the entry at start in bibstr when it is first needed
+        """
+        bib = cls(entry_dict)
+        object.__setattr__(bib, '_pending', (bibstr, start))
+        return bib
+
+    @classmethod
+    def _skip_space(cls, bibstr:str, pos:int) -> int:
+        return cls.SPACE_RE.match(bibstr, pos).end()
+
+    @classmethod
+    def _scan_value(cls, bibstr:str, pos:int):
+        """ :returns: tuple (value, position after the value) for the braced,
+                      quoted or numeric value starting at pos
+        """
+        opener = bibstr[pos:pos+1]
+        if opener == '{':
+            # fast path for the common case of a value without nested braces
+            end = bibstr.find('}', pos + 1)
+            if end != -1 and bibstr.find('{', pos + 1, end) == -1:
+                return bibstr[pos+1:end], end + 1
+            depth = 1
+            for brace in cls.BRACE_RE.finditer(bibstr, pos + 1):
+                depth += 1 if brace.group() == '{' else -1
+                if depth == 0:
+                    return bibstr[pos+1:brace.start()], brace.end()
+            raise FormatError(len(bibstr), "unbalanced '{'")
+        if opener == '"':
+            depth = 0
+            for token in cls.QUOTE_RE.finditer(bibstr, pos + 1):
+                if (char := token.group()) == '"':
+                    if depth == 0:
+                        return bibstr[pos+1:token.start()], token.end()
+                elif char == '{':
+                    depth += 1
+                elif (depth := depth - 1) < 0:
+                    raise FormatError(token.start(), "unbalanced '}'")
+            raise FormatError(len(bibstr), "unterminated '\"'")
+        if number_match := cls.NUMBER_RE.match(bibstr, pos):
+            return number_match.group(), number_match.end()
+        raise FormatError(pos if opener else len(bibstr), "expected value")
+
+    @classmethod # Alternative constructor
+    def from_xattr(cls, filepath, *, fields=None):
+        """ :param fields: the tags the caller needs, see from_str """
+        if (data := cls.stored(filepath)) is None:
+            return None
+        with stats.current.phase('parse'):
+            return cls.from_str(cls.decode(data), fields=fields)
+
+    @classmethod
+    def stored(cls, filepath):
+        """ :returns: the entry attached to filepath as stored, unparsed, or
+                      None if there is none
+        """
+        filepath = Path(filepath)
+        if not filepath.exists():
+            raise FileNotFoundError(errno.ENOENT, "File not Found"
+                                                                , str(filepath))
+        with stats.current.phase('xattr'):
+            from xattr import xattr # deferred: catalog hits never need it
+            if not (x_ := xattr(filepath)).has_key(cls.XATTR_KEY):
+                return None
+            return stats.current.read_xattr(x_.get(cls.XATTR_KEY))
+
+    @classmethod
+    def decode(cls, data:bytes) -> str:
+        """ :returns: the entry text of xattr data in any format version
+            :raises FormatError: if data is in a version or codec not known here,
+                                 or is not utf-8
+        """
+        header = len(cls.XATTR_MAGIC) + 2
+        try:
+            if not data.startswith(cls.XATTR_MAGIC): # unversioned
+                return data.decode()
+            version, codec = data[header - 2], data[header - 1:header]
+            if version != cls.XATTR_VERSION:
+                raise FormatError(0, "unsupported entry format version "
+                                                                  f"{version}")
+            if codec == cls.XATTR_PLAIN:
+                return data[header:].decode()
+            if codec == cls.XATTR_ZLIB:
+                try:
+                    return zlib.decompress(data[header:]).decode()
+                except zlib.error as e:
+                    raise FormatError(header, f"corrupt compressed entry: {e}")\
+                                                                         from e
+        except UnicodeDecodeError as e: # e.g. a legacy entry in latin-1
+            raise FormatError(e.start, f"entry is not utf-8 ({e.reason})")\
+                                                                         from e
+        raise FormatError(header - 1, f"unsupported entry codec {codec!r}")
+
+    def encode(self) -> bytes:
+        """ :returns: the entry in the current xattr format """
+        data = repr(self).encode()
+        codec = self.XATTR_PLAIN
+        if len(data) > self.COMPRESS_ABOVE:
+            if len(compressed := zlib.compress(data)) < len(data):
+                data, codec = compressed, self.XATTR_ZLIB
+        return self.XATTR_MAGIC + bytes((self.XATTR_VERSION,)) + codec + data
+
+    def is_stored(self, filepath, *, exact=False) -> bool:
+        """ :param exact: only if stored in the current format, as encode()
+            :returns: whether filepath already holds this entry
+        """
+        if (data := self.stored(filepath)) is None:
+            return False
+        if data == self.encode():
+            return True
+        try:
+            return not exact and self.decode(data) == repr(self)
+        except (FormatError, UnicodeDecodeError):
+            return False
+
+    @classmethod
+    def read_entries(cls, source, *, on_error=None, chunk_size=1 << 20):
+        """ Parse entries one at a time, reading source incrementally so memory
+            use is bounded by the largest entry rather than the whole input
+            :param source: a str of bibtex entries, or a text/binary file object
+                           or mmap to be read chunk_size characters at a time
+            :param on_error: called with each FormatError - parsing resumes at
+                             the next @type{ - instead of raising it
+            :yields: BibTeXEntry objects
+            :raises FormatError: With the position of the offending character
+                                 counted from the start of source
+        """
+        if isinstance(source, str):
+            buffer, read = source, None
+        else:
+            buffer, read = '', source.read
+            decoder = codecs.getincrementaldecoder('utf-8')()
+        offset = pos = 0 # offset of buffer in source, pos of next entry in it
+
+        while True:
+            try:
+                entry, end = cls.from_str(buffer, pos, return_end=True)
+            except FormatError as e:
+                # the buffer may end anywhere, even mid-token: read more unless
+                # the entry's braces already balance within the buffer
+                if read and len(buffer) - pos < cls.MAX_ENTRY_SIZE \
+                                 and not cls._is_complete(buffer, pos):
+                    entry, end = None, pos
+                else:
+                    error = FormatError(offset + e.args[0], *e.args[1:])
+                    if on_error is None:
+                        raise error from None
+                    on_error(error)
+                    pos = cls.TYPE_RE.search(buffer, pos).start() + 1
+                    continue
+            else:
+                if entry is not None:
+                    yield entry
+                    pos = end
+                    continue
+                if read: # an entry may begin in the tail of the buffer
+                    end = max(buffer.rfind('@', pos), pos)
+            if not read:
+                return
+            if not (chunk := read(chunk_size)):
+                read = None # at the end of source - one final attempt to parse
+            if isinstance(chunk, bytes):
+                chunk = decoder.decode(chunk, final=not chunk)
+            offset, buffer, pos = offset + end, buffer[end:] + chunk, 0
+
+    @classmethod
+    def _is_complete(cls, bibstr:str, pos:int) -> bool:
+        """ :returns: whether the braces of the next entry in bibstr balance """
+        depth = 1
+        for brace in cls.BRACE_RE.finditer(bibstr
+                                        , cls.TYPE_RE.search(bibstr, pos).end()):
+            depth += 1 if brace.group() == '{' else -1
+            if depth == 0:
+                return True
+        return False
+
+    def inject(self, filepath, *, skip_unchanged=False, migrate=False) -> bool:
+        """ :param skip_unchanged: leave the xattr, and so the ctime of the
+                                  file, alone if it already holds this entry
+            :param migrate: with skip_unchanged, still rewrite an entry stored
+                            in an older format
+            :returns: whether the xattr was written
+        """
+        filepath = Path(filepath)
+        if not filepath.exists():
+            raise FileNotFoundError(errno.ENOENT, "File not Found"
+                                                                , str(filepath))
+        if skip_unchanged and self.is_stored(filepath, exact=migrate):
+            return False
+        with stats.current.phase('inject'):
+            from xattr import xattr
+            xattr(filepath).set(self.XATTR_KEY, self.encode())
+            from .catalog import record_injection # deferred: catalog imports us
+            record_injection(filepath, self)
+        return True
+
+    def autoset_citekey(self, filepath=None) -> None:
+        """ Set the citekey to the first author's surname and the year
+            :param filepath: the file the entry is for - the citekey is then
+                             suffixed with a, b, ... if another file in its
+                             directory or in the catalog already has it
+        """
+        if author := self.get('author'):
+            name = re.match(r'\s*(?P<name>\w+)', author).group('name').lower()
+        else:
+            name = ''
+        year = self.get('year', '') # string expected
+        self.citekey = name + year
+        if filepath is not None:
+            from .catalog import unique_citekey # deferred: catalog imports us
+            self.citekey = unique_citekey(self.citekey, filepath)
+
+    def __str__(self):
+        if self._str is None:
+            self._complete()
+            tags = ',\n\t'.join(f'{name} = {{{value}}}'
+                             for name, value in zip(self._layout.tags, self._values))
+            object.__setattr__(self, '_str'
+                          , f'@{self.type}{{{self.citekey},\n\t{tags} \n}}')
+                            # that space kept entries readable by the old regular
+                            # expression parser, which needed it to find the end
+        return self._str
+
+    def __repr__(self): # compact form of __str__ stored in the xattr
+        if self._repr is None:
+            self._complete()
+            tags = ','.join(f'{name}={{{value}}}'
+                             for name, value in zip(self._layout.tags, self._values))
+            object.__setattr__(self, '_repr'
+                                      , f'@{self.type}{{{self.citekey},{tags} }}')
+        return self._repr
@@ -0,0 +1,266 @@
+# persistent cache of the BibTeX entries attached to a library of pdfs
+import atexit
+import json
+import os
+import sqlite3
+import sys
+import threading
+
+from pathlib import Path
+
+from . import stats
+from .bibtex_entry import BibTeXEntry, FormatError
+from .entry_keys import keys_of, suffixed
+
+def default_path() -> Path:
+    """ :returns: location of the catalog, $REFFER_CATALOG overrides the
+                  default under $XDG_CACHE_HOME (or ~/.cache)
+    """
+    if custom := os.environ.get('REFFER_CATALOG'):
+        return Path(custom)
+    cache_home = os.environ.get('XDG_CACHE_HOME') or Path.home() / '.cache'
+    return Path(cache_home) / 'reffer' / 'catalog.sqlite3'
+
+def stamp(st: os.stat_result) -> tuple:
+    """ Cheap change detector - xattr writes bump ctime even when the pdf
+        itself is untouched, so ctime is what catches edits to BibTeX entries
+        and skim notes
+    """
+    return (st.st_ino, st.st_size, st.st_mtime_ns, st.st_ctime_ns)
+
+class Catalog:
+    """ Maps a file's resolved path and stamp() to its parsed BibTeX entry
+        Entries are revalidated with a single stat and only re-read from the
+        xattr (and re-parsed) when the stamp has changed
+    """
+    SCHEMA = ('CREATE TABLE IF NOT EXISTS entries (path TEXT PRIMARY KEY'
+              ', ino INTEGER, size INTEGER, mtime INTEGER, ctime INTEGER'
+              ', entry TEXT)')   # entry is json or NULL if no BibTeX entry
+    # entry_keys.keys_of each entry, kept in step with entries
+    KEYS_SCHEMA = ('CREATE TABLE IF NOT EXISTS entry_keys (path TEXT'
+                   ', kind TEXT, key TEXT)'
+                  , 'CREATE INDEX IF NOT EXISTS entry_keys_key ON '
+                                                      'entry_keys (kind, key)'
+                  , 'CREATE INDEX IF NOT EXISTS entry_keys_path ON '
+                                                           'entry_keys (path)')
+    COMMIT_EVERY = 500           # rows written between implicit commits
+
+    _default = None
+    _default_lock = threading.Lock()
+
+    def __init__(self, path=None, *, rebuild=False):
+        self.path = Path(path) if path else default_path()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(self.path, timeout=30
+                                                      , check_same_thread=False)
+        if rebuild:
+            self._db.execute('DROP TABLE IF EXISTS entries')
+            self._db.execute('DROP TABLE IF EXISTS entry_keys')
+        self._db.execute(self.SCHEMA)
+        backfill = not self._db.execute("SELECT 1 FROM sqlite_master WHERE "
+                                 "name = 'entry_keys'").fetchone()
+        for statement in self.KEYS_SCHEMA:
+            self._db.execute(statement)
+        if backfill: # a catalog from before entry_keys
+            rows = self._db.execute('SELECT path, entry FROM entries WHERE '
+                                              'entry IS NOT NULL').fetchall()
+            self._db.executemany('INSERT INTO entry_keys VALUES (?, ?, ?)'
+                      , ((path, *kind_key) for path, data in rows
+                         for kind_key in keys_of(BibTeXEntry(json.loads(data)))))
+            self._db.commit()
+        self._pending = 0
+        self._reserved = {} # citekey: path given it by unique_citekey
+        self._scanned = set() # directories catalogued by scan
+
+    @classmethod
+    def default(cls, *, rebuild=False):
+        """ :returns: the process wide catalog, committed on interpreter exit
+        """
+        # under a lock: the workers of -j opening a connection each would
+        # lock each other out of the database
+        with cls._default_lock:
+            if cls._default is None:
+                cls._default = cls(rebuild=rebuild)
+                atexit.register(cls._default.close)
+            elif rebuild:
+                cls._default.clear()
+            return cls._default
+
+    @staticmethod
+    def key(filepath) -> str:
+        """ :returns: the path filepath is catalogued under """
+        return os.path.realpath(filepath)
+
+    def entry(self, filepath, st=None):
+        """ Drop in replacement for BibTeXEntry.from_xattr
+            :param st: stat of filepath if the caller already has one
+            :returns: a BibTeXEntry or None if the file has no entry
+            :raises FormatError: if the stored entry does not parse
+        """
+        key = self.key(filepath)
+        if st is None: # walker.LibraryFile carries the stat taken while walking
+            st = getattr(filepath, 'st', None) or os.stat(key)
+        with stats.current.phase('catalog'):
+            with self._lock:
+                row = self._db.execute('SELECT ino, size, mtime, ctime, entry '
+                                   'FROM entries WHERE path = ?', (key,)).fetchone()
+            if row and tuple(row[:4]) == stamp(st):
+                return BibTeXEntry(json.loads(row[4])) if row[4] else None
+
+        bib = BibTeXEntry.from_xattr(key)
+        self._store(key, st, bib)
+        return bib
+
+    def record(self, filepath, bib) -> None:
+        """ Bring the catalog up to date with an entry just written to filepath
+        """
+        key = self.key(filepath)
+        self._store(key, os.stat(key), bib)
+
+    def files_with(self, kind:str, key:str) -> list:
+        """ :returns: the paths of the catalogued files whose entry has key,
+                      see entry_keys.keys_of
+        """
+        with self._lock:
+            return [row[0] for row in self._db.execute('SELECT path FROM '
+                        'entry_keys WHERE kind = ? AND key = ?', (kind, key))]
+
+    def scan(self, directory) -> None:
+        """ Catalogue the pdfs in directory, once per process - those the
+            catalog is up to date on cost a stat each
+        """
+        from .walker import walk # deferred: only unique_citekey scans
+        with self._lock:
+            if (key := self.key(directory)) in self._scanned:
+                return
+            self._scanned.add(key)
+            for filepath in walk((key,)):
+                try:
+                    self.entry(filepath)
+                except (OSError, FormatError): # reported if the file is used
+                    pass
+
+    def unique_citekey(self, citekey:str, filepath) -> str:
+        """ :returns: citekey, or citekey with the first of the suffixes a,
+                      b, ... that no other file in filepath's directory or in
+                      the catalog (still existing) has or has been given by
+                      this method
+        """
+        if not citekey:
+            return citekey
+        key = self.key(filepath)
+        with self._lock:
+            # files never shown or searched may not be catalogued yet
+            self.scan(os.path.dirname(key))
+            # one range scan of the index covers citekey and all its suffixes,
+            # only those still held by an existing file count
+            taken = {row[0] for row in self._db.execute("SELECT key, path FROM "
+                           "entry_keys WHERE kind = 'citekey' AND key >= ? AND "
+                           "key < ? AND path != ?"
+                           , (citekey, citekey + '\U0010ffff', key))
+                           if _is_suffixed(row[0], citekey)
+                                                   and os.path.exists(row[1])}
+            taken.update(reserved for reserved, path in self._reserved.items()
+                                                                 if path != key)
+            for candidate in suffixed(citekey):
+                if candidate not in taken:
+                    self._reserved[candidate] = key
+                    return candidate
+
+    def create_tables(self, schema:dict, *, rebuild=False) -> None:
+        """ Add tables of other caches kept alongside the entries
+            :param schema: {table name: CREATE statements for it and its indexes}
+            :param rebuild: drop the tables first
+        """
+        with self._lock:
+            for table, statements in schema.items():
+                if rebuild:
+                    self._db.execute(f'DROP TABLE IF EXISTS {table}')
+                for statement in statements:
+                    self._db.execute(statement)
+            self._db.commit()
+
+    def execute(self, sql:str, params=()) -> list:
+        """ :returns: all rows resulting from sql """
+        with self._lock:
+            rows = self._db.execute(sql, params).fetchall()
+            if not sql.startswith('SELECT'):
+                self._changed()
+        return rows
+
+    def executemany(self, sql:str, param_rows) -> None:
+        with self._lock:
+            self._db.executemany(sql, param_rows)
+            self._changed()
+
+    def forget(self, filepath) -> None:
+        with self._lock:
+            self._db.execute('DELETE FROM entries WHERE path = ?'
+                                                       , (self.key(filepath),))
+            self._db.execute('DELETE FROM entry_keys WHERE path = ?'
+                                                       , (self.key(filepath),))
+            self._changed()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._db.execute('DELETE FROM entries')
+            self._db.execute('DELETE FROM entry_keys')
+            self._db.commit()
+
+    def commit(self) -> None:
+        with self._lock:
+            self._db.commit()
+            self._pending = 0
+
+    def _store(self, key, st, bib) -> None:
+        data = json.dumps(bib.to_dict()) if bib is not None else None
+        with self._lock:
+            self._db.execute('INSERT OR REPLACE INTO entries VALUES '
+                             '(?, ?, ?, ?, ?, ?)', (key, *stamp(st), data))
+            self._db.execute('DELETE FROM entry_keys WHERE path = ?', (key,))
+            if bib is not None:
+                self._db.executemany('INSERT INTO entry_keys VALUES (?, ?, ?)'
+                              , ((key, *kind_key) for kind_key in keys_of(bib)))
+            self._changed()
+
+    def _changed(self) -> None:
+        self._pending += 1
+        if self._pending >= self.COMMIT_EVERY:
+            self.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._db is not None:
+                self._db.commit()
+                self._db.close()
+                self._db = None
+
+def _is_suffixed(key:str, citekey:str) -> bool:
+    """ :returns: whether key is citekey, with letters added or not """
+    suffix = key[len(citekey):]
+    return not suffix or suffix.isalpha()
+
+_unrecordable = False # whether record_injection has given up on the catalog
+
+def record_injection(filepath, bib) -> None:
+    """ Called by BibTeXEntry.inject so an existing catalog never serves the
+        entry that was just overwritten. No catalog is created as a side effect
+        and one that cannot be opened or written is left alone - the entry is
+        already in the file, whose new stamp the catalog will not match
+    """
+    global _unrecordable
+    if _unrecordable or Catalog._default is None \
+                                           and not default_path().exists():
+        return
+    try:
+        Catalog.default().record(filepath, bib)
+    except (OSError, sqlite3.Error) as e: # e.g. a corrupt catalog file
+        if not _unrecordable:
+            _unrecordable = True
+            print(f"WARNING: cannot update the catalog ({e}), entries are "
+                   "written to their files only", file=sys.stderr)
+
+def unique_citekey(citekey:str, filepath) -> str:
+    """ Catalog.unique_citekey of the process wide catalog """
+    return Catalog.default().unique_citekey(citekey, filepath)
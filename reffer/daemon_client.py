@@ -0,0 +1,66 @@
+# hands a tool's command line to rdaemon.py when one is running
+# kept to the standard library so forwarding costs no more than the imports,
+# and to os and sys until there is a socket to forward to
+import os
+import sys
+
+# options that ask for fresh reads, which only a run of the tool itself gives
+BYPASS_OPTIONS = frozenset(('--no-daemon', '--no-cache', '--rebuild-cache'))
+
+def socket_path() -> str:
+    """ :returns: location of the daemon's socket, $REFFER_SOCKET overrides the
+                  default next to the catalog
+    """
+    if custom := os.environ.get('REFFER_SOCKET'):
+        return custom
+    cache_home = os.environ.get('XDG_CACHE_HOME') \
+                                    or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(cache_home, 'reffer', 'daemon.sock')
+
+def connect(path=None, timeout=0.05):
+    """ :returns: a socket connected to the daemon or None if none is running
+    """
+    import socket
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    client.settimeout(timeout)
+    try:
+        client.connect(path or socket_path())
+    except OSError: # no socket file, or left behind by a daemon that died
+        client.close()
+        return None
+    client.settimeout(None)
+    return client
+
+def forward(tool:str, argv:list):
+    """ Run tool with argv in the daemon, relaying its output as it comes
+        :returns: the exit status or None if the tool has to run itself
+    """
+    if os.environ.get('REFFER_NO_DAEMON') or not BYPASS_OPTIONS.isdisjoint(argv):
+        return None
+    if not os.path.exists(path := socket_path()):
+        return None
+    if (client := connect(path)) is None:
+        return None
+    import json
+    with client, client.makefile('rwb') as stream:
+        stream.write(json.dumps({'tool': tool, 'argv': argv
+                                        , 'cwd': os.getcwd()}).encode() + b'\n')
+        stream.flush()
+        outputs, last = {1: sys.stdout, 2: sys.stderr}, None
+        try:
+            for line in stream:
+                message = json.loads(line)
+                if 'exit' in message:
+                    if last is not None:
+                        last.flush()
+                    return message['exit']
+                output = outputs[message['stream']]
+                if last is not None and output is not last: # as Report.replay
+                    last.flush()
+                output.write(message['text'])
+                last = output
+        except BrokenPipeError: # e.g. piped to head - the daemon sees it go
+            from .formats import stdout_closed
+            return stdout_closed()
+    print("ERROR: daemon closed the connection", file=sys.stderr)
+    return 1
@@ -0,0 +1,64 @@
+# the citekey, DOI and title fingerprint of an entry - what identifies the
+# work a file holds, kept per file in the catalog so that citekeys can be made
+# unique and files holding the same work found without comparing every pair
+import re
+
+from collections import defaultdict
+from itertools import count, product
+from string import ascii_lowercase
+
+KINDS = ('citekey', 'doi', 'title')
+DOI_PREFIX_RE = re.compile(r'^\s*(?:https?://(?:dx\.)?doi\.org/|doi:\s*)'
+                                                              , re.IGNORECASE)
+WORD_RE = re.compile(r'[^\W_]+')
+LATEX_MARKUP_RE = re.compile(r'\\[^\w\s]|\\[a-zA-Z]+\s*|[{}]') # {\"o}, \emph{
+MIN_TITLE_WORDS = 3 # shorter titles ('Introduction') are shared by too much
+
+def normalize_doi(doi:str) -> str:
+    """ :returns: doi without a resolver or 'doi:' prefix, lower case as DOIs
+                  are case insensitive
+    """
+    return DOI_PREFIX_RE.sub('', doi).strip().lower()
+
+def title_fingerprint(title:str):
+    """ :returns: the words of title without case, accents, LaTeX markup
+                  or punctuation, or None if it is too short to tell works apart
+    """
+    import unicodedata # deferred: catalog imports this module for keys_of
+    text = LATEX_MARKUP_RE.sub('', title)
+    text = ''.join(c_ for c_ in unicodedata.normalize('NFKD', text)
+                                               if not unicodedata.combining(c_))
+    words = WORD_RE.findall(text.casefold())
+    return ' '.join(words) if len(words) >= MIN_TITLE_WORDS else None
+
+def keys_of(bib) -> list:
+    """ :returns: (kind, key) for each of KINDS that bib has """
+    keys = []
+    if bib.citekey:
+        keys.append(('citekey', bib.citekey))
+    if doi := normalize_doi(bib.get('doi', '')):
+        keys.append(('doi', doi))
+    if fingerprint := title_fingerprint(bib.get('title', '')):
+        keys.append(('title', fingerprint))
+    return keys
+
+def suffixed(citekey:str):
+    """ :yields: citekey, then citekey with a, b, ..., z, aa, ab, ... added """
+    yield citekey
+    for length in count(1):
+        for letters in product(ascii_lowercase, repeat=length):
+            yield citekey + ''.join(letters)
+
+def find_duplicates(entries) -> dict:
+    """ :param entries: (filepath, BibTeXEntry or None) pairs
+        :returns: {(kind, key): [filepath, ...]} for each key shared by more
+                  than one file, ordered by kind then key
+    """
+    files = defaultdict(list)
+    for filepath, bib in entries:
+        if bib is not None:
+            for kind_key in keys_of(bib):
+                files[kind_key].append(filepath)
+    return {kind_key: files[kind_key] for kind_key in sorted(files
+                  , key=lambda kind_key: (KINDS.index(kind_key[0]), kind_key[1]))
+                                                 if len(files[kind_key]) > 1}
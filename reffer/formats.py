@@ -0,0 +1,114 @@
+# the --format of rshow.py and rsrch.py: one record per file, formatted as
+# json lines, csv or BibTeX and written to stdout in large chunks
+import os
+import sys
+
+FORMATS = ('text', 'jsonl', 'csv', 'bib')
+BUFFER_SIZE = 1 << 16 # characters collected between writes
+# the tags of BibTeXEntry.ENTRY_TEMPLATE, the csv columns of a whole entry
+STANDARD_TAGS = ('author', 'doi', 'edition', 'editor', 'journal', 'keywords'
+                , 'number', 'pages', 'publisher', 'school', 'title', 'url'
+                , 'volume', 'year')
+
+class RecordWriter:
+    """ Formats records and writes them to a stream whenever buffer_size
+        characters have been collected
+        stdout is looked up when the writer is made, so that rdaemon.py's
+        stand in for it is used
+    """
+    def __init__(self, stream=None, buffer_size:int=BUFFER_SIZE):
+        self.stream = stream or sys.stdout
+        self.buffer_size = buffer_size
+        self._chunks = []
+        self._size = 0
+
+    def format(self, record) -> str:
+        raise NotImplementedError
+
+    def write(self, record) -> None:
+        text = self.format(record)
+        self._chunks.append(text)
+        self._size += len(text)
+        if self._size >= self.buffer_size:
+            self.flush()
+
+    def write_all(self, records) -> None:
+        """ Write each record of an iterable, then flush """
+        for record in records:
+            self.write(record)
+        self.flush()
+
+    def flush(self) -> None:
+        if self._chunks:
+            self.stream.write(''.join(self._chunks))
+            self._chunks.clear()
+            self._size = 0
+        self.stream.flush()
+
+class JsonlWriter(RecordWriter):
+    """ Records are dicts, written one json object per line """
+    def __init__(self, stream=None, buffer_size:int=BUFFER_SIZE):
+        import json # deferred: only this format needs it
+        super().__init__(stream, buffer_size)
+        self._dumps = json.dumps
+
+    def format(self, record:dict) -> str:
+        return self._dumps(record, ensure_ascii=False) + '\n'
+
+class CsvWriter(RecordWriter):
+    """ Records are dicts whose 'tags', if any, count as columns of their own
+        and whose lists are joined by spaces
+    """
+    def __init__(self, columns, stream=None, buffer_size:int=BUFFER_SIZE):
+        import csv, io
+        super().__init__(stream, buffer_size)
+        self.columns = tuple(columns)
+        self._line = io.StringIO()
+        self._csv = csv.writer(self._line, lineterminator='\n')
+        self._chunks.append(self._row(self.columns))
+        self._size += len(self._chunks[0])
+
+    def _row(self, values) -> str:
+        self._line.seek(0)
+        self._line.truncate()
+        self._csv.writerow(values)
+        return self._line.getvalue()
+
+    def format(self, record:dict) -> str:
+        fields = {**record, **(record.get('tags') or {})}
+        return self._row(' '.join(value) if isinstance(value, list)
+                              else '' if value is None else value
+                              for value in map(fields.get, self.columns))
+
+class BibWriter(RecordWriter):
+    """ Records are BibTeXEntry objects, see file_entry """
+    def format(self, bib) -> str:
+        return f"{bib}\n\n"
+
+def file_entry(bib, filepath):
+    """ :returns: a copy of bib whose file tag names filepath, which is how
+                  `rset.py -m` finds the file to inject it into
+    """
+    return type(bib)({**bib.to_dict(), 'file': os.path.abspath(filepath)})
+
+def writer(format:str, columns=()) -> RecordWriter:
+    """ :param format: one of FORMATS but text
+        :param columns: of csv output
+    """
+    if format == 'csv':
+        return CsvWriter(columns)
+    return {'jsonl': JsonlWriter, 'bib': BibWriter}[format]()
+
+def stdout_closed() -> int:
+    """ Call on BrokenPipeError, when whatever reads stdout (e.g. `| head`)
+        has stopped reading, so that flushing stdout on exit does not fail too
+        :returns: the exit status of a tool killed by SIGPIPE
+    """
+    try:
+        fd = sys.stdout.fileno()
+    except (OSError, ValueError): # rdaemon.py's stand in has no file
+        return 141
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, fd)
+    os.close(devnull)
+    return 141
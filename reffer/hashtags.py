@@ -0,0 +1,103 @@
+# hashtags in the keywords and skim notes of a library, counted per file and
+# collated across files - json and the catalog are imported where they are
+# used, counting needs neither
+import os
+import re
+
+from collections import Counter, defaultdict
+from itertools import combinations
+
+HASHTAG_RE = re.compile(r'#\w+(?:(:\d+)|(\(.*?\)))?')
+
+def count_hashtags(bib, notes:str) -> Counter:
+    """ :returns: how often each hashtag occurs in the keywords of bib (which
+                  may be None) and in notes, in order of first occurrence
+    """
+    counts = Counter()
+    if bib is not None and (keywords := bib.get('keywords')):
+        counts.update(match.group() for match in HASHTAG_RE.finditer(keywords))
+    counts.update(match.group() for match in HASHTAG_RE.finditer(notes))
+    return counts
+
+class HashtagCache:
+    """ count_hashtags of each file kept in the catalog database alongside
+        its stamp, so that only files that changed have their notes read
+    """
+    SCHEMA = {
+        'hashtags': ('CREATE TABLE IF NOT EXISTS hashtags (path TEXT PRIMARY KEY'
+                    ', ino INTEGER, size INTEGER, mtime INTEGER, ctime INTEGER'
+                    ', counts TEXT)',) # json of the file's Counter
+    }
+
+    def __init__(self, catalog, *, rebuild=False):
+        """ :param catalog: a catalog.Catalog """
+        self.catalog = catalog
+        catalog.create_tables(self.SCHEMA, rebuild=rebuild)
+
+    def counts(self, filepath, read_entry, read_notes, st=None) -> Counter:
+        """ :param read_entry: callable returning the BibTeXEntry of a file
+            :param read_notes: callable returning the text notes of a file
+            :returns: count_hashtags for filepath, recounted only if it changed
+        """
+        import json
+        from .catalog import stamp
+        key = self.catalog.key(filepath)
+        if st is None:
+            st = getattr(filepath, 'st', None) or os.stat(key)
+        row = self.catalog.execute('SELECT ino, size, mtime, ctime, counts FROM'
+                                        ' hashtags WHERE path = ?', (key,))
+        if row and tuple(row[0][:4]) == stamp(st):
+            return Counter(json.loads(row[0][4]))
+
+        counts = count_hashtags(read_entry(filepath), read_notes(filepath))
+        self.catalog.execute('INSERT OR REPLACE INTO hashtags VALUES (?, ?, ?, ?'
+                                  ', ?, ?)', (key, *stamp(st), json.dumps(counts)))
+        return counts
+
+class HashtagCollation:
+    """ Hashtag counts of many files merged one file at a time into totals,
+        co-occurrences and the files each hashtag occurs in
+    """
+    def __init__(self):
+        self.counts = Counter()          # hashtag: occurrences in all files
+        self.cooccurrences = defaultdict(Counter) # hashtag: {other: files}
+        self.files = defaultdict(list)   # hashtag: files it occurs in
+
+    def add(self, filepath, counts:Counter) -> None:
+        self.counts.update(counts)
+        for hashtag in counts:
+            self.files[hashtag].append(str(filepath))
+        for a_, b_ in combinations(counts, 2):
+            self.cooccurrences[a_][b_] += 1
+            self.cooccurrences[b_][a_] += 1
+
+    def most_common(self) -> list:
+        """ :returns: (hashtag, count) pairs, most frequent first and
+                      alphabetical among equally frequent ones
+        """
+        return sorted(self.counts.items(), key=lambda item: (-item[1], item[0]))
+
+    def to_text(self, related:int=3) -> str:
+        """ :param related: how many of the hashtags occurring in the most
+                            files alongside each hashtag to list
+        """
+        lines = ["Collated Hashtags:"]
+        for hashtag, count in self.most_common():
+            line = f"\t{count}\t{hashtag}"
+            if others := sorted(self.cooccurrences[hashtag].items()
+                                 , key=lambda item: (-item[1], item[0]))[:related]:
+                line += "\twith " + ", ".join(f"{other} ({files})"
+                                                      for other, files in others)
+            lines.append(line)
+        return "\n".join(lines)
+
+    def to_json(self) -> str:
+        import json
+        return json.dumps({
+            'counts': dict(self.most_common())
+          , 'cooccurrences': {hashtag: dict(self.cooccurrences[hashtag])
+                                 for hashtag, _ in self.most_common()
+                                 if hashtag in self.cooccurrences}
+          , 'files': {hashtag: self.files[hashtag]
+                                            for hashtag, _ in self.most_common()}
+        }, indent=2)
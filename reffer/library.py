@@ -0,0 +1,69 @@
+# where the tools get their files, BibTeX entries and skim notes from
+import sys
+import threading
+
+from . import stats
+from .bibtex_entry import BibTeXEntry
+from .hashtags import count_hashtags
+from .skim_notes import text_notes
+from .walker import walk
+
+class Library:
+    """ Entries are read through the catalog unless it is disabled
+        rdaemon.py substitutes a subclass that keeps everything in memory
+    """
+    def __init__(self, catalog=None, *, rebuild=False):
+        """ :param rebuild: discard what caches other than catalog entries
+                            hold about the library when they are first used
+        """
+        self.catalog = catalog
+        self.rebuild = rebuild
+        self._hashtag_cache = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_args(cls, args):
+        """ :param args: parsed --no-cache and --rebuild-cache options """
+        if args.no_cache:
+            return cls()
+        import sqlite3 # deferred, as is the catalog: --no-cache needs neither
+        from .catalog import Catalog
+        try:
+            catalog = Catalog.default(rebuild=args.rebuild_cache)
+        except (OSError, sqlite3.Error) as e: # e.g. a read-only cache directory
+            print(f"WARNING: cannot open the catalog ({e}), reading every "
+                   "entry from its file", file=sys.stderr)
+            return cls()
+        return cls(catalog, rebuild=args.rebuild_cache)
+
+    def walk(self, targets, **options):
+        """ :yields: walker.LibraryFile objects, see walker.walk """
+        return stats.current.timed('walk', walk(targets, **options))
+
+    def entry(self, filepath, fields=None):
+        """ :param fields: the tags the caller needs, if not all - only a hint,
+                           see BibTeXEntry.from_str
+            :returns: the BibTeXEntry attached to filepath or None
+        """
+        if self.catalog is None:
+            return BibTeXEntry.from_xattr(filepath, fields=fields)
+        return self.catalog.entry(filepath) # stores whole entries
+
+    def notes(self, filepath) -> str:
+        """ :returns: the skim notes of filepath as text """
+        with stats.current.phase('notes'):
+            return text_notes(filepath)
+
+    def hashtags(self, filepath):
+        """ :returns: Counter of the hashtags in the keywords and notes of
+                      filepath, see hashtags.count_hashtags
+        """
+        if self.catalog is None:
+            return count_hashtags(self.entry(filepath), self.notes(filepath))
+        if self._hashtag_cache is None:
+            with self._lock: # -j workers must not each make one - and rebuild
+                if self._hashtag_cache is None:
+                    from .hashtags import HashtagCache
+                    self._hashtag_cache = HashtagCache(self.catalog
+                                                       , rebuild=self.rebuild)
+        return self._hashtag_cache.counts(filepath, self.entry, self.notes)
@@ -0,0 +1,79 @@
+# bounded worker pool whose results come back in submission order
+import sys
+
+from collections import deque
+
+from . import stats
+from .bibtex_entry import FormatError
+from .skim_notes import NotesFormatError
+
+# what reading the entry or notes of one file may raise, see Report.record_error
+FILE_ERRORS = (OSError, FormatError, NotesFormatError)
+
+class Report:
+    """ Output of the work on one file, buffered so that it can be produced by
+        a worker thread and replayed by the main thread in traversal order
+    """
+    __slots__ = ('chunks', 'error')
+
+    def __init__(self):
+        self.chunks = [] # (to_stderr, text) in the order they were printed
+        self.error = None
+
+    def print(self, *values, sep=' ', end='\n', file=None, flush=False):
+        self.chunks.append((file is sys.stderr, sep.join(map(str, values))+end))
+
+    def record_error(self, error:Exception, filepath) -> None:
+        """ Print one of FILE_ERRORS, raised working on filepath, and keep it
+            as the error the exit status is taken from
+        """
+        if isinstance(error, FormatError):
+            self.print(f"WARNING: {error.args[1]} at char {error.args[0]} in "
+                       f"the entry of '{filepath}'", file=sys.stderr)
+        elif isinstance(error, NotesFormatError):
+            self.print(f"WARNING: unreadable skim notes in '{filepath}': "
+                                                     f"{error}", file=sys.stderr)
+        else:
+            self.print(f"ERROR: {error.strerror or error}: '{error.filename}'"
+                                                              , file=sys.stderr)
+        self.error = error
+
+    def replay(self) -> None:
+        """ Write the buffered output, flushing whenever the stream changes so
+            stdout and stderr interleave as if printed directly
+        """
+        with stats.current.phase('output'):
+            last = None
+            for to_stderr, text in self.chunks:
+                stream = sys.stderr if to_stderr else sys.stdout
+                if last is not None and stream is not last:
+                    last.flush()
+                stream.write(text)
+                last = stream
+            if last is not None:
+                last.flush()
+
+    def flush(self) -> None:
+        """ Replay what has been printed so far and forget it - for work done
+            on the main thread that is about to prompt the user
+        """
+        self.replay()
+        self.chunks.clear()
+
+def imap_ordered(func, iterable, jobs:int=1):
+    """ Like map(func, iterable) but run on up to jobs threads
+        At most a few items per job are in flight at once, so arbitrarily long
+        iterables are consumed lazily
+    """
+    if jobs <= 1:
+        yield from map(func, iterable)
+        return
+    from concurrent.futures import ThreadPoolExecutor # costly, and often unused
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        pending = deque()
+        for item in iterable:
+            pending.append(pool.submit(func, item))
+            if len(pending) >= 4 * jobs:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
@@ -0,0 +1,357 @@
+# rsrch.py queries compiled once into a tree of predicates, evaluated per file
+# with the cheapest tests first so skim notes are only read when they decide
+import re
+
+from .skim_notes import NOTE_HEADING_RE
+
+class QueryError(ValueError): pass
+
+class Candidate:
+    """ A file under test - its entry and notes are read once, on first use """
+    __slots__ = ('filepath', 'library', 'fields', '_bib', '_notes')
+    _UNREAD = object()
+
+    def __init__(self, filepath, library, fields=None):
+        """ :param fields: the tags the query tests, see Predicate.fields """
+        self.filepath = filepath
+        self.library = library
+        self.fields = fields
+        self._bib = self._notes = self._UNREAD
+
+    @property
+    def bib(self):
+        if self._bib is self._UNREAD:
+            self._bib = self.library.entry(self.filepath, self.fields)
+        return self._bib
+
+    @property
+    def notes(self) -> list:
+        """ :returns: (heading, text) of each skim note """
+        if self._notes is self._UNREAD:
+            note_iter = iter(NOTE_HEADING_RE.split(
+                                         self.library.notes(self.filepath))[1:])
+            self._notes = list(zip(note_iter, note_iter))
+        return self._notes
+
+    def field(self, name:str):
+        """ :returns: the value of a tag, citekey or type, or None """
+        if (bib := self.bib) is None:
+            return None
+        return bib.get(name)
+
+class Predicate:
+    """ cost is a rough estimate of the work test does, used to order the
+        children of And and Or
+    """
+    __slots__ = ()
+    cost = 1
+
+    def test(self, candidate) -> bool:
+        raise NotImplementedError
+
+    def report(self, candidate) -> list:
+        """ :returns: lines showing why candidate matches, if it does """
+        return []
+
+    def matches(self, candidate) -> list:
+        """ :returns: what report shows as dicts - each with the 'field' and
+                      its 'value', or the 'note' heading and its 'text', and
+                      the 'start' and 'end' offsets of the 'match' in them
+        """
+        return []
+
+    def candidates(self, index):
+        """ :returns: the paths of the files a search_index.SearchIndex shows
+                      may match, or None if it cannot tell
+        """
+        return None
+
+    def fields(self) -> frozenset:
+        """ :returns: the tags test and report read """
+        return frozenset()
+
+class FieldContains(Predicate):
+    __slots__ = ('name', 'term')
+
+    def __init__(self, name:str, term:str):
+        self.name = name
+        self.term = term.casefold() # once for all files
+
+    def test(self, candidate) -> bool:
+        value = candidate.field(self.name)
+        return value is not None and self.term in value.casefold()
+
+    def report(self, candidate) -> list:
+        if not self.test(candidate):
+            return []
+        if self.name == 'citekey':
+            return [f"\tcitekey: {candidate.bib.citekey}\n"]
+        return [f"\t{self.name} = {{{candidate.field(self.name)}}}\n"]
+
+    def matches(self, candidate) -> list:
+        if (span := self._span(candidate.field(self.name))) is None:
+            return []
+        value = candidate.field(self.name)
+        return [{'field': self.name, 'value': value, 'start': span[0]
+                , 'end': span[1], 'match': value[span[0]:span[1]]}]
+
+    def _span(self, value):
+        """ :returns: (start, end) of the first match in value, or None """
+        if value is None or (start := value.casefold().find(self.term)) < 0:
+            return None
+        return start, start + len(self.term)
+
+    def candidates(self, index):
+        return index.substring_candidates(self.term, self.name)
+
+    def fields(self) -> frozenset:
+        return frozenset((self.name,))
+
+class FieldRegex(FieldContains):
+    __slots__ = ('regex',)
+    cost = 2
+
+    def __init__(self, name:str, pattern:str):
+        self.name = name
+        self.regex = _compile(pattern)
+
+    def test(self, candidate) -> bool:
+        value = candidate.field(self.name)
+        return value is not None and self.regex.search(value) is not None
+
+    def _span(self, value):
+        if value is None or (match := self.regex.search(value)) is None:
+            return None
+        return match.span()
+
+    def candidates(self, index):
+        return None
+
+class FieldExists(Predicate):
+    __slots__ = ('name',)
+
+    def __init__(self, name:str):
+        self.name = name
+
+    def test(self, candidate) -> bool:
+        return candidate.field(self.name) is not None
+
+    def report(self, candidate) -> list:
+        if (value := candidate.field(self.name)) is None:
+            return []
+        return [f"\t{self.name} = {{{value}}}\n"]
+
+    def matches(self, candidate) -> list:
+        if (value := candidate.field(self.name)) is None:
+            return []
+        return [{'field': self.name, 'value': value, 'start': 0
+                , 'end': len(value), 'match': value}]
+
+    def fields(self) -> frozenset:
+        return frozenset((self.name,))
+
+class NotesRegex(Predicate):
+    __slots__ = ('pattern', 'regex')
+    cost = 50 # reads, and maybe decompresses and renders, the notes
+
+    def __init__(self, pattern:str):
+        self.pattern = pattern
+        self.regex = _compile(pattern, re.DOTALL)
+
+    def _matches(self, candidate):
+        for heading, note in candidate.notes:
+            if match := self.regex.search(note.lstrip()):
+                yield heading, note, match
+
+    def test(self, candidate) -> bool:
+        return next(self._matches(candidate), None) is not None
+
+    def report(self, candidate) -> list:
+        from textwrap import TextWrapper # only needed once a note matches
+        layout = TextWrapper(initial_indent='\t ', subsequent_indent='\t'
+                                                            , expand_tabs=False)
+        return [f"\t{heading}: found "
+                   + '"' + match.group().replace('\n',' ') + '"\n'
+                   + layout.fill(note)
+                   + "\n\n" for heading, note, match in self._matches(candidate)]
+
+    def matches(self, candidate) -> list:
+        # offsets are into the text stripped of the blank lines around it
+        return [{'note': heading, 'text': note.strip(), 'start': match.start()
+                , 'end': match.end(), 'match': match.group()}
+                          for heading, note, match in self._matches(candidate)]
+
+    def candidates(self, index):
+        return index.note_candidates(self.pattern)
+
+class NotesContains(NotesRegex):
+    __slots__ = ('term',)
+
+    def __init__(self, term:str):
+        self.term = term
+        self.pattern = re.escape(term)
+        self.regex = re.compile(self.pattern, re.IGNORECASE)
+
+    def candidates(self, index):
+        return index.substring_candidates(self.term, note=True)
+
+class And(Predicate):
+    __slots__ = ('children', 'cost')
+
+    def __init__(self, children):
+        self.children = sorted(children, key=lambda child: child.cost)
+        self.cost = sum(child.cost for child in self.children)
+
+    def test(self, candidate) -> bool:
+        return all(child.test(candidate) for child in self.children)
+
+    def report(self, candidate) -> list:
+        return [line for child in self.children
+                                          for line in child.report(candidate)]
+
+    def matches(self, candidate) -> list:
+        return [match for child in self.children
+                                       for match in child.matches(candidate)]
+
+    def candidates(self, index):
+        result = None
+        for child in self.children:
+            if (files := child.candidates(index)) is not None:
+                result = files if result is None else result & files
+        return result
+
+    def fields(self) -> frozenset:
+        return frozenset().union(*(child.fields() for child in self.children))
+
+class Or(And):
+    __slots__ = ()
+
+    def test(self, candidate) -> bool:
+        return any(child.test(candidate) for child in self.children)
+
+    def candidates(self, index):
+        result = set()
+        for child in self.children:
+            if (files := child.candidates(index)) is None:
+                return None
+            result |= files
+        return result
+
+class Not(Predicate):
+    __slots__ = ('child', 'cost')
+
+    def __init__(self, child:Predicate):
+        self.child = child
+        self.cost = child.cost
+
+    def test(self, candidate) -> bool:
+        return not self.child.test(candidate)
+
+    def fields(self) -> frozenset:
+        return self.child.fields()
+
+def _compile(pattern:str, flags=0):
+    try:
+        return re.compile(pattern, flags)
+    except re.error as e:
+        raise QueryError(f"bad regular expression '{pattern}': {e}") from e
+
+# a query is terms combined with and, or, not and parentheses - adjacent
+# terms are and'ed. A term is FIELD:TEXT (TEXT in FIELD, ignoring case),
+# FIELD~REGEX, has:FIELD, notes:TEXT or notes~REGEX. TEXT and REGEX may be
+# quoted with ' or "
+TOKEN_RE = re.compile(r'''\s*(?:(?P<paren>[()])
+                          |(?P<field>[-\w]+)(?P<op>[:~])
+                           (?:"(?P<dquoted>(?:[^"\\]|\\.)*)"
+                             |'(?P<squoted>(?:[^'\\]|\\.)*)'
+                             |(?P<bare>[^\s()]+))
+                          |(?P<word>[-\w]+))''', flags=re.VERBOSE)
+
+def _term(field:str, op:str, value:str) -> Predicate:
+    if field == 'has' and op == ':':
+        return FieldExists(value)
+    if field == 'notes':
+        return NotesContains(value) if op == ':' else NotesRegex(value)
+    return FieldContains(field, value) if op == ':' else FieldRegex(field, value)
+
+def parse(query:str) -> Predicate:
+    """ :returns: the predicate tree of query
+        :raises QueryError: if query is not well formed
+    """
+    tokens, pos = [], 0
+    while pos < len(query.rstrip()):
+        if not (match := TOKEN_RE.match(query, pos)):
+            raise QueryError(f"unexpected '{query[pos:].strip()}' in query")
+        pos = match.end()
+        if match['paren'] or match['word']:
+            tokens.append(match['paren'] or match['word'].lower())
+        else:
+            value = next(v_ for v_ in (match['dquoted'], match['squoted']
+                                          , match['bare']) if v_ is not None)
+            if match['bare'] is None: # only the quote itself is escaped
+                value = re.sub(r'\\(["\'\\])', r'\1', value)
+            tokens.append(_term(match['field'], match['op'], value))
+    tokens.append(None) # end marker
+    position = 0
+
+    def peek():
+        return tokens[position]
+
+    def take():
+        nonlocal position
+        position += 1
+        return tokens[position - 1]
+
+    def disjunction():
+        children = [conjunction()]
+        while peek() == 'or':
+            take()
+            children.append(conjunction())
+        return children[0] if len(children) == 1 else Or(children)
+
+    def conjunction():
+        children = [negation()]
+        while peek() not in ('or', ')', None):
+            if peek() == 'and':
+                take()
+            children.append(negation())
+        return children[0] if len(children) == 1 else And(children)
+
+    def negation():
+        if peek() == 'not':
+            take()
+            return Not(negation())
+        return atom()
+
+    def atom():
+        token = take()
+        if token == '(':
+            node = disjunction()
+            if take() != ')':
+                raise QueryError("missing ')' in query")
+            return node
+        if isinstance(token, Predicate):
+            return token
+        raise QueryError(f"expected a search term, not {token or 'the end'!r}")
+
+    tree = disjunction()
+    if peek() is not None:
+        raise QueryError(f"unexpected {peek()!r} in query")
+    return tree
+
+def compile_args(args):
+    """ :returns: the predicate tree of the rsrch.py options in args, or None
+                  if they do not ask for anything
+    """
+    terms = []
+    if args.citekey:
+        terms.append(FieldContains('citekey', args.citekey))
+    for search_tag, search_term in args.tag or ():
+        terms.append(FieldContains(search_tag, search_term))
+    if args.notes:
+        terms.append(NotesRegex(args.notes))
+    if args.query:
+        terms.append(parse(args.query))
+    if not terms:
+        return None
+    return (And if args.all else Or)(terms)
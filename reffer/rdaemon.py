@@ -0,0 +1,379 @@
+# keeps a library in memory and answers rsrch.py and rshow.py over a socket
+
+import ctypes, ctypes.util
+import functools
+import io
+import json
+import operator
+import os, sys, errno
+import socket
+import struct
+import threading
+import time
+import traceback
+
+from argparse import ArgumentParser
+
+from . import daemon_client
+from . import rshow
+from . import rsrch
+from .catalog import Catalog, stamp
+from .library import Library
+
+TOOLS = {'rshow': rshow.main, 'rsrch': rsrch.main}
+
+class CachedLibrary(Library):
+    """ Directory listings, BibTeX entries and skim notes kept in memory
+        Listings are dropped by the watcher when a directory changes; entries
+        and notes are keyed by (st_dev, st_ino) and checked against the stamp
+        the walk took, so with inotify a warm query makes no system calls per
+        file - other watchers cannot see files change, so each is re-stat'ed
+    """
+    def __init__(self, catalog=None):
+        super().__init__(catalog)
+        self.listings = {} # absolute path of a directory: its os.DirEntry list
+        self.watcher = None
+        self._entries = {} # (st_dev, st_ino): (stamp, BibTeXEntry or None)
+        self._notes = {}   # (st_dev, st_ino): (stamp, text)
+        self._hashtags = {} # (st_dev, st_ino): (stamp, Counter)
+
+    def scandir(self, top:str) -> list:
+        """ walker scandir whose DirEntry objects, and so their stat, are kept
+        """
+        key = os.path.abspath(top)
+        if (listing := self.listings.get(key)) is None:
+            # watched before listing, not to miss a change - a directory that
+            # cannot be watched is listed afresh every time
+            watched = self.watcher is None or self.watcher.watch(key)
+            with os.scandir(top) as it_:
+                listing = list(it_)
+            if watched:
+                self.listings[key] = listing
+        return listing
+
+    def invalidate(self, directory=None) -> None:
+        """ Forget the listing of directory, or of all directories if None """
+        if directory is None:
+            self.listings.clear()
+        else:
+            self.listings.pop(directory, None)
+
+    def walk(self, targets, **options):
+        files = super().walk(targets, scandir=self.scandir, **options)
+        if self.watcher is None or self.watcher.sees_files:
+            return files
+        return self._restat(files)
+
+    @staticmethod
+    def _restat(files):
+        """ :yields: files with a fresh stat, for a watcher that only sees
+                     entries being added to or removed from directories
+        """
+        for file in files:
+            if file.st is not None: # else a missing target, to be reported
+                try:
+                    file.st = os.stat(file.path)
+                except OSError: # vanished since it was listed
+                    continue
+            yield file
+
+    def _cached(self, cache:dict, filepath, read):
+        st = getattr(filepath, 'st', None) or os.stat(filepath)
+        key, file_stamp = (st.st_dev, st.st_ino), stamp(st)
+        if (hit := cache.get(key)) is not None and hit[0] == file_stamp:
+            return hit[1]
+        value = read(filepath)
+        cache[key] = (file_stamp, value)
+        return value
+
+    def entry(self, filepath, fields=None): # whole entries are kept
+        return self._cached(self._entries, filepath, super().entry)
+
+    def notes(self, filepath) -> str:
+        return self._cached(self._notes, filepath, super().notes)
+
+    def hashtags(self, filepath):
+        return self._cached(self._hashtags, filepath, super().hashtags)
+
+class InotifyWatcher:
+    """ Drops the listing of each watched directory as soon as anything in it
+        (or an xattr of anything in it) changes
+    """
+    IN_MODIFY, IN_ATTRIB, IN_CLOSE_WRITE = 0x2, 0x4, 0x8
+    IN_MOVED_FROM, IN_MOVED_TO, IN_CREATE, IN_DELETE = 0x40, 0x80, 0x100, 0x200
+    IN_DELETE_SELF, IN_MOVE_SELF = 0x400, 0x800
+    IN_Q_OVERFLOW, IN_IGNORED, IN_ONLYDIR = 0x4000, 0x8000, 0x1000000
+    EVENTS = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM \
+             | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF
+    EVENT_HEADER = struct.Struct('iIII') # wd, mask, cookie, len of name
+    sees_files = True # events on a directory include changes to its files
+
+    def __init__(self, library:CachedLibrary):
+        """ :raises OSError: if inotify is not available """
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        try:
+            self._add_watch = libc.inotify_add_watch
+            self.fd = libc.inotify_init1(os.O_CLOEXEC)
+        except AttributeError: # not linux
+            raise OSError(errno.ENOSYS, "inotify is not available") from None
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), os.strerror(ctypes.get_errno()))
+        self.library = library
+        self._directories = {} # watch descriptor: directory
+
+    def watch(self, directory:str) -> bool:
+        """ :returns: whether changes to directory will be seen """
+        wd = self._add_watch(self.fd, os.fsencode(directory)
+                                               , self.EVENTS | self.IN_ONLYDIR)
+        if wd >= 0:
+            self._directories[wd] = directory
+        # else the listing fails as well, or the watch limit is reached
+        return wd >= 0
+
+    def run(self) -> None:
+        while True:
+            data = os.read(self.fd, 1 << 16)
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = self.EVENT_HEADER.unpack_from(data, offset)
+                offset += self.EVENT_HEADER.size + length
+                if mask & self.IN_Q_OVERFLOW: # events were lost
+                    self.library.invalidate()
+                elif (directory := self._directories.get(wd)) is not None:
+                    self.library.invalidate(directory)
+                    if mask & self.IN_IGNORED: # directory gone, watch removed
+                        del self._directories[wd]
+
+class KqueueWatcher:
+    """ Drops the listing of each watched directory when an entry is added to,
+        removed from or renamed in it - kqueue, of macOS and the BSDs, does
+        not report changes to the files in a directory, see CachedLibrary
+    """
+    NOTES = ('KQ_NOTE_WRITE', 'KQ_NOTE_EXTEND', 'KQ_NOTE_LINK', 'KQ_NOTE_DELETE'
+            , 'KQ_NOTE_RENAME', 'KQ_NOTE_REVOKE')
+    GONE = ('KQ_NOTE_DELETE', 'KQ_NOTE_RENAME', 'KQ_NOTE_REVOKE')
+    # macOS: a descriptor only for events, which does not keep the volume busy
+    O_EVTONLY = 0x8000 if sys.platform == 'darwin' else 0
+    sees_files = False
+
+    def __init__(self, library:CachedLibrary):
+        """ :raises OSError: if kqueue is not available """
+        import select
+        if not hasattr(select, 'kqueue'):
+            raise OSError(errno.ENOSYS, "kqueue is not available")
+        self._select = select
+        self._notes = functools.reduce(operator.or_
+                                   , (getattr(select, n) for n in self.NOTES))
+        self._gone = functools.reduce(operator.or_
+                                    , (getattr(select, n) for n in self.GONE))
+        self.kq = select.kqueue()
+        self.library = library
+        self._lock = threading.Lock()
+        self._fds = {}         # directory: descriptor open on it
+        self._directories = {} # descriptor: directory
+
+    def watch(self, directory:str) -> bool:
+        """ :returns: whether changes to directory will be seen - not when
+                      out of file descriptors, which each directory takes
+        """
+        select = self._select
+        with self._lock:
+            if directory in self._fds:
+                return True
+            try:
+                fd = os.open(directory, os.O_RDONLY | self.O_EVTONLY)
+            except OSError:
+                return False
+            try:
+                self.kq.control([select.kevent(fd, select.KQ_FILTER_VNODE
+                            , select.KQ_EV_ADD | select.KQ_EV_CLEAR
+                            , self._notes)], 0)
+            except OSError:
+                os.close(fd)
+                return False
+            self._fds[directory] = fd
+            self._directories[fd] = directory
+        return True
+
+    def run(self) -> None:
+        while True:
+            for event in self.kq.control(None, 64):
+                with self._lock:
+                    if (directory := self._directories.get(event.ident)) is None:
+                        continue
+                    if event.fflags & self._gone: # the path is stale now
+                        del self._directories[event.ident], self._fds[directory]
+                        os.close(event.ident)
+                self.library.invalidate(directory)
+
+class PollingWatcher:
+    """ Relists the cached directories every interval seconds and drops the
+        listings in which an entry appeared or vanished - files are re-stat'ed
+        by CachedLibrary, so their own changes need no polling
+    """
+    sees_files = False
+
+    def __init__(self, library:CachedLibrary, interval:float):
+        self.library = library
+        self.interval = interval
+
+    def watch(self, directory:str) -> bool:
+        return True # the library's listings are what is polled
+
+    @staticmethod
+    def _signature(listing) -> set:
+        # inode() comes with the listing, a stat per entry is not needed
+        return {(entry.name, entry.inode()) for entry in listing}
+
+    def run(self) -> None:
+        while True:
+            time.sleep(self.interval)
+            for directory, listing in list(self.library.listings.items()):
+                try:
+                    with os.scandir(directory) as it_:
+                        current = self._signature(it_)
+                except OSError:
+                    current = None
+                if current != self._signature(listing):
+                    self.library.invalidate(directory)
+
+class _Relay(io.TextIOBase):
+    """ Stands in for sys.stdout or sys.stderr while a tool runs, sending what
+        it writes to the client
+    """
+    def __init__(self, stream, number:int):
+        self._stream = stream
+        self._number = number
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, text:str) -> int:
+        if text:
+            self._stream.write(json.dumps({'stream': self._number
+                                               , 'text': text}).encode() + b'\n')
+        return len(text)
+
+    def flush(self) -> None:
+        pass # both streams share the connection, which keeps them in order
+
+def run_tool(request:dict, stream, library:CachedLibrary) -> int:
+    """ Run the tool in request as if from the client's shell
+        :returns: its exit status
+    """
+    stdout, stderr, cwd = sys.stdout, sys.stderr, os.getcwd()
+    sys.stdout, sys.stderr = _Relay(stream, 1), _Relay(stream, 2)
+    try:
+        os.chdir(request['cwd'])
+        return TOOLS[request['tool']](request['argv'], library)
+    except SystemExit as e: # argparse on bad or --help arguments
+        if e.code is None or isinstance(e.code, int):
+            return e.code or 0
+        print(e.code, file=sys.stderr)
+        return 1
+    except (BrokenPipeError, ConnectionResetError): # client gone
+        raise
+    except Exception:
+        traceback.print_exc()
+        return 1
+    finally:
+        sys.stdout, sys.stderr = stdout, stderr
+        os.chdir(cwd)
+
+def serve(path:str, library:CachedLibrary) -> None:
+    """ Answer requests on the socket at path one at a time until told to stop
+    """
+    if probe := daemon_client.connect(path):
+        probe.close()
+        sys.exit(f"ERROR: a daemon is already listening on '{path}'")
+    if os.path.exists(path): # left behind by a daemon that died
+        os.unlink(path)
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    umask = os.umask(0o177) # only the owner may query the library
+    try:
+        server.bind(path)
+    finally:
+        os.umask(umask)
+    server.listen()
+    print(f"listening on '{path}'", file=sys.stderr)
+
+    try:
+        while True:
+            connection, _ = server.accept()
+            try:
+                with connection, connection.makefile('rwb') as stream:
+                    request = json.loads(stream.readline())
+                    if request.get('tool') == 'stop':
+                        return
+                    if request.get('tool') not in TOOLS:
+                        continue
+                    status = run_tool(request, stream, library)
+                    stream.write(json.dumps({'exit': status}).encode() + b'\n')
+            except (ValueError, OSError): # client gone or not a client
+                pass
+            finally:
+                if library.catalog is not None: # other processes may write
+                    library.catalog.commit()
+    finally:
+        server.close()
+        os.unlink(path)
+
+def stop(path:str) -> int:
+    if (client := daemon_client.connect(path)) is None:
+        print(f"ERROR: no daemon is listening on '{path}'", file=sys.stderr)
+        return 1
+    with client:
+        client.sendall(json.dumps({'tool': 'stop'}).encode() + b'\n')
+    return 0
+
+def build_parser(prog='rdaemon.py') -> ArgumentParser:
+    parser = ArgumentParser(prog=prog
+                          , description="serve rsrch.py and rshow.py queries "
+                            "from a library kept in memory; both tools use the "
+                            "daemon whenever it is running")
+    parser.add_argument('--socket', default=daemon_client.socket_path()
+                                   , help="where to listen (default %(default)s)")
+    parser.add_argument('--poll', type=float, default=2.0, metavar=('SECONDS')
+                          , help="how often to rescan directories when neither "
+                          "inotify nor kqueue is available")
+    parser.add_argument('--no-inotify', action='store_true'
+                    , help="poll for changes even if inotify or kqueue works")
+    parser.add_argument('--stop', action='store_true'
+                                         , help="stop the running daemon")
+    parser.add_argument('target', nargs='*'
+                   , help="directories to load before answering queries")
+    return parser
+
+def main(argv=None, *, prog='rdaemon.py') -> int:
+    """ :returns: exit status """
+    args = build_parser(prog).parse_args(argv)
+
+    if args.stop:
+        return stop(args.socket)
+
+    library = CachedLibrary(Catalog.default())
+    watcher = None
+    if not args.no_inotify:
+        for kind in (InotifyWatcher, KqueueWatcher):
+            try:
+                watcher = kind(library)
+                break
+            except OSError as e:
+                error = e
+        else:
+            print(f"{error.strerror}: polling every {args.poll}s instead"
+                                                              , file=sys.stderr)
+    library.watcher = watcher or PollingWatcher(library, args.poll)
+    threading.Thread(target=library.watcher.run, daemon=True).start()
+
+    for filepath in library.walk(args.target, recursive=True):
+        try:
+            library.entry(filepath)
+            library.notes(filepath)
+        except Exception: # reported when the file is queried
+            pass
+    if library.catalog is not None: # unlock it for the other tools
+        library.catalog.commit()
+    serve(args.socket, library)
+    return 0
@@ -0,0 +1,221 @@
+# written by nathan sinclair
+
+import os, sys, errno
+import sqlite3
+
+from argparse import ArgumentParser
+from collections import Counter
+from pathlib import Path
+from time import sleep
+
+from .bibtex_entry import BibTeXEntry, FormatError
+from .parallel import Report, imap_ordered
+from .walker import walk
+from . import stats
+
+def edit_in_editor(bib):
+    """ Let the user write bib, or a new entry from the template if None, in
+        $EDITOR until it parses
+        :returns: the BibTeXEntry written
+    """
+    import subprocess, tempfile
+    EDITOR = os.environ.get('EDITOR', 'nano')
+    tf = tempfile.NamedTemporaryFile(suffix='.tmp', delete=False)
+    if bib:
+        tf.write(str(bib).encode())
+    else:
+        tf.write(BibTeXEntry.ENTRY_TEMPLATE.encode())
+    tf.close()
+    try:
+        while True: # repeat until no errors raised
+            try:
+                subprocess.run([EDITOR, tf.name])
+                tf = open(tf.name, 'r')
+                return BibTeXEntry.from_str(tf.read())
+            except FormatError as e:
+                print('WARNING: Could not recognise entry format: '
+                     f'{e.args[1]} at char {e.args[0]}'
+                     , file=sys.stderr)
+                sleep(4)
+            finally:
+                tf.close()
+    finally:
+        os.remove(tf.name)
+
+def apply_edits(bib, args, filepath=None) -> None:
+    """ Modify bib as the command line options in args ask
+        :param filepath: the file bib is for, to keep autoset citekeys unique
+    """
+    if args.citekey:
+        bib.citekey = args.citekey
+
+    elif args.autocitekey:
+        bib.autoset_citekey(filepath)
+
+    if args.tag:
+        for key, value in args.tag:
+            bib.set(key, value)
+
+    if args.tagappend:
+        for key, suffix in args.tagappend:
+            bib.set(key, bib.get(key, '') + suffix)
+
+    if args.tagedit:
+        import readline
+        try:
+            for key in args.tagedit:
+                default = bib.get(key, '')
+                readline.set_startup_hook(lambda: readline.insert_text(default))
+                new_value = input(f"\tSet '{key}' to: ")
+                bib.set(key, new_value or None) # an empty answer removes it
+        finally:
+            readline.set_startup_hook()
+
+def describe_changes(old:dict, new:dict) -> list:
+    """ :returns: a line for each tag (type and citekey included) that differs
+                  between the to_dict() of two entries
+    """
+    lines = []
+    for tag in sorted(old.keys() | new.keys(), key=lambda tag: (
+                                   tag not in ('type', 'citekey'), tag)):
+        if tag not in new:
+            lines.append(f"\t- {tag} = {{{old[tag]}}}")
+        elif tag not in old:
+            lines.append(f"\t+ {tag} = {{{new[tag]}}}")
+        elif old[tag] != new[tag]:
+            lines.append(f"\t~ {tag} = {{{old[tag]}}} -> {{{new[tag]}}}")
+    return lines
+
+def edit_file(filepath, args):
+    """ Apply the edits in args to the entry of one file
+        :returns: tuple ('updated', 'unchanged', 'skipped' or 'failed', Report)
+    """
+    report = Report()
+    try:
+        filepath = Path(filepath).resolve()
+        if filepath.is_dir():
+            raise IsADirectoryError(errno.EISDIR, "Is a directory"
+                                                            , str(filepath))
+
+        bib = BibTeXEntry.from_xattr(filepath)
+
+        if args.interactive:
+            old = bib.to_dict() if bib else {}
+            bib = edit_in_editor(bib)
+        elif bib is None:
+            report.print(f'{filepath}:\n\tNo BibTeX entry attached to file'
+                                                          , file=sys.stderr)
+            return 'skipped', report
+        else:
+            old = bib.to_dict()
+
+        report.print(f"{filepath.name}:", file=sys.stderr)
+        if args.interactive or args.tagedit: # one file at a time, see main
+            report.flush() # name the file before -te prompts for it
+        # various ways to modify bib based on command option
+        apply_edits(bib, args, filepath)
+
+        if args.dry_run:
+            if bib.is_stored(filepath, exact=args.migrate):
+                report.print("\tno change")
+                return 'unchanged', report
+            report.print("\n".join(describe_changes(old, bib.to_dict()))
+                                         or "\tentry would be rewritten")
+            return 'updated', report
+
+        if bib.inject(filepath, skip_unchanged=True, migrate=args.migrate):
+            report.print(f'\tBibTeX entry for "{filepath}" updated')
+            return 'updated', report
+        report.print(f'\tBibTeX entry for "{filepath}" unchanged')
+        return 'unchanged', report
+
+    except OSError as e:
+        report.print(f"ERROR: {e.strerror}: {e.filename}", file=sys.stderr)
+        report.error = e
+    except FormatError as e:
+        report.print(f"ERROR: {e.args[1]} at char {e.args[0]} in the entry of "
+                                              f"{filepath}", file=sys.stderr)
+    except sqlite3.Error as e: # from the catalog, e.g. while finding -ac keys
+        report.print(f"ERROR: catalog: {e}: {filepath}", file=sys.stderr)
+        report.error = e
+    return 'failed', report
+
+def targets(args):
+    """ :yields: the files named on the command line, '-' standing for one
+                 per line on stdin, with directories walked if args.recursive
+    """
+    for target in args.target:
+        if target == '-':
+            yield from (line.rstrip('\n') for line in sys.stdin
+                                                         if line.strip())
+        elif args.recursive and os.path.isdir(target):
+            yield from walk((target,), recursive=True)
+        else:
+            yield target
+
+def build_parser(prog='redit.py') -> ArgumentParser:
+    parser = ArgumentParser(prog=prog)
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument('-c', '--citekey'
+                               , help="set the citekey of the entry to CITEKEY")
+    group.add_argument('-ac', '--autocitekey',  action='store_true'
+                 , help="autoset the citekey of the entry, adding a, b, ... "
+                 "if another file in the same directory or in the catalog "
+                 "already has it")
+
+    parser.add_argument('-t', '--tag', nargs=2, action='append'
+              , metavar=('TAG','VALUE'), help="set the content of TAG to VALUE")
+    parser.add_argument('-te', '--tagedit', action='append', metavar=('TAGNAME')
+                             , help='interactively edit the content of TAGNAME')
+    parser.add_argument('-ta', '--tagappend', nargs=2, action='append'
+                                   , metavar=('TAG', "ADDENDUM")
+                                   , help="append ADDENDUM to the value of TAG")
+
+    parser.add_argument('-r', '--recursive', action='store_true'
+                 , help="edit every pdf in directory targets and their "
+                 "sub-directories")
+    parser.add_argument('-j', '--jobs', type=int, default=1, metavar=('N')
+                 , help="edit N files at a time (ignored when editing "
+                 "interactively)")
+    parser.add_argument('-n', '--dry-run', action='store_true'
+                 , help="show what would change in each entry without writing")
+    parser.add_argument('--migrate', action='store_true'
+                 , help="rewrite entries stored in an older format in the "
+                 "current one, whether or not they are edited")
+    stats.add_arguments(parser)
+    parser.add_argument('target', nargs='+'
+                   , help="file(s) with BibTeX entry to be edited, '-' to read "
+                   "their names from stdin one per line")
+    return parser
+
+def main(argv=None, *, prog='redit.py') -> int:
+    """ :returns: exit status """
+    parser = build_parser(prog)
+    args = parser.parse_args(argv)
+
+    args.interactive = not (args.citekey or args.autocitekey or args.tag
+                         or args.tagedit or args.tagappend or args.migrate)
+    if args.interactive or args.tagedit:
+        if '-' in args.target:
+            parser.error("editing interactively needs stdin, so file names "
+                         "cannot be read from it")
+        args.jobs = 1 # one prompt at a time
+
+    def edit_timed(filepath):
+        with stats.current.file(filepath):
+            return edit_file(filepath, args)
+
+    with stats.session(args):
+        counts = Counter()
+        exit_status = 0
+        for status, report in imap_ordered(edit_timed, targets(args), args.jobs):
+            counts[status] += 1
+            report.replay()
+            if status == 'failed' and not exit_status:
+                exit_status = getattr(report.error, 'errno', None) or 1
+        if sum(counts.values()) > 1:
+            print(f"{counts['updated']} "
+                  f"{'to update' if args.dry_run else 'updated'}"
+                  f", {counts['unchanged']} unchanged, {counts['skipped']} "
+                  f"skipped, {counts['failed']} failed", file=sys.stderr)
+        return exit_status
@@ -0,0 +1,133 @@
+# written by nathan sinclair
+
+import errno
+import sqlite3
+import sys
+from argparse import ArgumentParser
+from collections import Counter
+from pathlib import Path
+
+from .bibtex_entry import BibTeXEntry, FormatError
+from .catalog import unique_citekey
+from .parallel import Report, imap_ordered
+from . import stats
+
+def open_source(bibfile):
+    """ :returns: bibfile memory-mapped, or bibfile itself if it cannot be """
+    import mmap
+    try:
+        source = mmap.mmap(bibfile.fileno(), 0, access=mmap.ACCESS_READ)
+    except (ValueError, OSError): # empty file, pipe, ...
+        return bibfile
+    if hasattr(source, 'madvise'):
+        source.madvise(mmap.MADV_SEQUENTIAL)
+    return source
+
+def entries_and_errors(source):
+    """ :yields: each BibTeXEntry in source, or the FormatError raised in its
+                  place, in the order they occur
+    """
+    errors = []
+    for bib in BibTeXEntry.read_entries(source, on_error=errors.append):
+        yield from errors
+        errors.clear()
+        yield bib
+    yield from errors
+
+def inject_entry(bib, unique_citekeys=False):
+    """ Inject bib into the file named by its file tag
+        :param unique_citekeys: add a, b, ... to the citekey of bib if
+                                another file in the catalog already has it
+        :returns: tuple ('injected' or 'skipped' or 'failed', Report)
+    """
+    report = Report()
+    if isinstance(bib, FormatError):
+        report.print(f"WARNING: {bib.args[1]} at char {bib.args[0]}.\n"
+                                      "Injection failed.", file=sys.stderr)
+        return 'failed', report
+    if not hasattr(bib, 'file'):
+        report.print(f"WARNING: Entry for '{bib.get('title', bib.citekey)}'"
+                     " does not have a 'file' tag.\nEntry skipped."
+                                                              , file=sys.stderr)
+        return 'skipped', report
+    try:
+        filepath = Path(bib.file).resolve()
+        del bib.file
+        if unique_citekeys:
+            citekey, bib.citekey = bib.citekey, unique_citekey(bib.citekey
+                                                                   , filepath)
+            if bib.citekey != citekey:
+                report.print(f"citekey '{citekey}' already used, "
+                             f"'{bib.citekey}' given instead", file=sys.stderr)
+        with stats.current.file(filepath):
+            bib.inject(filepath)
+        report.print(f'BibTeX Entry set for "{filepath}"')
+        return 'injected', report
+
+    except OSError as e:
+        filename = e.filename.decode() if isinstance(e.filename, bytes)\
+                                                                else e.filename
+        if isinstance(e, FileNotFoundError): # nothing to inject into
+            report.print(f"WARNING: {e.strerror}: '{filename}'\n"
+                                          "Entry skipped.", file=sys.stderr)
+            return 'skipped', report
+        report.print(f"WARNING: {e.strerror}: '{filename}'\n"
+                                      "Injection failed.", file=sys.stderr)
+        return 'failed', report
+    except sqlite3.Error as e: # from the catalog, e.g. while finding -u keys
+        report.print(f"WARNING: catalog: {e}: '{filepath}'\n"
+                                          "Injection failed.", file=sys.stderr)
+        return 'failed', report
+
+def build_parser(prog='rset.py') -> ArgumentParser:
+    parser = ArgumentParser(prog=prog)
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument('-m', '--multiple', action='store_true', help="read a sequence of BibTeX entries from target and inject them into the files specified in their file tags.")
+    group.add_argument('bibtexfile', nargs='?', help="file containing BibTeX entry to be injected")
+    parser.add_argument('-j', '--jobs', type=int, default=1, metavar=('N')
+              , help="with --multiple, inject N entries at a time")
+    parser.add_argument('-u', '--unique-citekeys', action='store_true'
+              , help="with --multiple, add a, b, ... to citekeys another file "
+              "in the same directory or in the catalog already has")
+    stats.add_arguments(parser)
+    parser.add_argument('target', help="file to be injected with BibTeX extry")
+    return parser
+
+def main(argv=None, *, prog='rset.py') -> int:
+    """ :returns: exit status """
+    args = build_parser(prog).parse_args(argv)
+
+    with stats.session(args):
+        try:
+            if args.multiple: # read multiple bibtex entries from args.target
+                with open(args.target, 'rb') as bibfile:
+                    counts = Counter()
+                    for status, report in imap_ordered(lambda bib: inject_entry(
+                                                       bib, args.unique_citekeys)
+                                    , stats.current.timed('parse'
+                                      , entries_and_errors(open_source(bibfile)))
+                                    , args.jobs):
+                        counts[status] += 1
+                        report.replay()
+                print(f"{counts['injected']} injected, {counts['skipped']} "
+                      f"skipped, {counts['failed']} failed", file=sys.stderr)
+                return 1 if counts['failed'] else 0
+
+            if args.bibtexfile: # entry in bibtexfile
+                bib = BibTeXEntry.from_str(open(args.bibtexfile, 'r').read())
+            else: # entry to be hand written by user from template
+                if not (fp_ := Path(args.target).resolve()).exists():
+                    raise FileNotFoundError(errno.ENOENT, "File not found"
+                                                                     , str(fp_))
+                from .redit import edit_in_editor
+                bib = edit_in_editor(None)
+
+            bib.inject(args.target)
+            print(f'Entry set for "{args.target}"')
+            return 0
+
+        except OSError as e:
+            if isinstance(e.filename, bytes):
+                e.filename = e.filename.decode()
+            print(f"ERROR: {e.strerror}: '{e.filename}'", file=sys.stderr)
+            return e.errno
@@ -0,0 +1,212 @@
+# written by nathan sinclair
+
+import sys
+
+from argparse import ArgumentParser
+from collections import Counter
+
+from . import formats
+from . import stats
+from .hashtags import HashtagCollation
+from .library import Library
+from .parallel import FILE_ERRORS, Report, imap_ordered
+
+def show_file(filepath, args, library):
+    """ Collect what is to be shown for one file
+        :returns: tuple (Report, Counter of the hashtags found in the file)
+    """
+    report = Report()
+    file_hashtags = Counter()
+    try:
+        bib = library.entry(filepath, args.fields)
+
+        report.print(f"{filepath.name}:", file=sys.stderr)
+
+        if args.hashtags or args.collatehashtags:
+            file_hashtags = library.hashtags(filepath)
+            if file_hashtags and args.hashtags:
+                report.print(f"\thashtags: {' '.join(file_hashtags)}")
+
+        if bib is None:
+            report.print('\tNo BibTeX entry attached to file\n', file=sys.stderr)
+            return report, file_hashtags
+
+        if args.type:
+            report.print(f"\ttype: {bib.type}")
+        if args.citekey:
+            report.print(f"\tcitekey: {bib.citekey}")
+        if args.tag:
+            for tag in args.tag:
+                if (value := bib.get(tag)) is not None:
+                    report.print(f"\t{tag} = {{{value}}}")
+                else:
+                    report.print(f"\t{tag}: NO SUCH TAG")
+
+
+        if not (args.type or args.citekey or args.tag or args.hashtags\
+                or args.collatehashtags):
+            report.print(bib)
+        report.print(flush=True) # if &> file - this interleaves stdout and stderr
+
+    except FILE_ERRORS as e:
+        report.record_error(e, filepath)
+    return report, file_hashtags
+
+def file_record(filepath, args, library):
+    """ Collect what is to be shown for one file in args.format
+        :returns: tuple (record or None, Report of any problem)
+    """
+    report = Report()
+    try:
+        bib = library.entry(filepath, args.fields)
+        if args.format == 'bib':
+            if bib is None:
+                report.print(f'{filepath}:\n\tNo BibTeX entry attached to file'
+                                                              , file=sys.stderr)
+                return None, report
+            return formats.file_entry(bib, filepath), report
+
+        whole = args.fields is None
+        record = {'path': str(filepath)}
+        if whole or args.type:
+            record['type'] = bib and bib.type
+        if whole or args.citekey:
+            record['citekey'] = bib and bib.citekey
+        if whole:
+            record['tags'] = bib and bib.tags()
+        elif args.tag:
+            record['tags'] = {tag: bib and bib.get(tag) for tag in args.tag}
+        if args.hashtags:
+            record['hashtags'] = list(library.hashtags(filepath))
+        return record, report
+
+    except FILE_ERRORS as e:
+        report.record_error(e, filepath)
+    return None, report
+
+def columns(args) -> list:
+    """ :returns: the csv columns of the records file_record makes """
+    whole = args.fields is None
+    return (['path'] + ['type'] * bool(whole or args.type)
+                     + ['citekey'] * bool(whole or args.citekey)
+                     + list(args.tag or (formats.STANDARD_TAGS if whole else ()))
+                     + ['hashtags'] * bool(args.hashtags))
+
+def export(args, library) -> int:
+    """ Write a record per file in args.format
+        :returns: exit status
+    """
+    def record_timed(filepath):
+        with stats.current.file(filepath):
+            return file_record(filepath, args, library)
+
+    def records():
+        nonlocal exit_status
+        for record, report in imap_ordered(record_timed
+                    , library.walk(args.target, recursive=args.recursive
+                       , exclude=args.exclude, follow_symlinks=args.follow_symlinks
+                       , max_depth=args.max_depth)
+                    , args.jobs):
+            report.replay()
+            if report.error and not exit_status:
+                exit_status = getattr(report.error, 'errno', None) or 1
+            if record is not None:
+                yield record
+
+    exit_status = 0
+    formats.writer(args.format, columns(args)).write_all(records())
+    return exit_status
+
+def show(args, library) -> int:
+    """ :returns: exit status of showing what args asks for """
+    def show_timed(filepath):
+        with stats.current.file(filepath):
+            return filepath, show_file(filepath, args, library)
+
+    # the tags shown, unless the whole entry is
+    args.fields = None
+    if args.format != 'bib' and (args.type or args.citekey or args.tag
+                               or args.hashtags or args.collatehashtags):
+        args.fields = frozenset(args.tag or ())
+    if args.format != 'text':
+        return export(args, library)
+
+    if args.collatehashtags:
+        collation = HashtagCollation()
+
+    exit_status = 0
+    for filepath, (report, file_hashtags) in imap_ordered(show_timed
+                    , library.walk(args.target, recursive=args.recursive
+                       , exclude=args.exclude, follow_symlinks=args.follow_symlinks
+                       , max_depth=args.max_depth)
+                    , args.jobs):
+        report.replay()
+        if report.error and not exit_status:
+            exit_status = getattr(report.error, 'errno', None) or 1
+        if args.collatehashtags:
+            collation.add(filepath, file_hashtags)
+    # end loop iterating files
+
+    if args.collatehashtags:
+        print(collation.to_json() if args.json else collation.to_text())
+    return exit_status
+
+def build_parser(prog='rshow.py') -> ArgumentParser:
+    parser = ArgumentParser(prog=prog)
+    parser.add_argument('-r', '--recursive', action='store_true'
+                                         , help="recurse on each sub-directory")
+    parser.add_argument('-y', '--type', action='store_true'
+                                     , help="show the BibTeX type of each file")
+    parser.add_argument('-c', '--citekey', action='store_true'
+                                         , help="show the citekey of each file")
+    parser.add_argument('-t', '--tag', action='append'
+                , metavar=('TAG'), help="show the content of TAG for each file")
+    parser.add_argument('-ht', '--hashtags', action='store_true'
+              , help="show the hashtags in the notes and keywords of each file")
+    parser.add_argument('-cht', '--collatehashtags', action='store_true'
+              , help="show a collated list of all hashtags in the notes and "
+              "keywords of all files, most frequent first")
+    parser.add_argument('--json', action='store_true'
+              , help="with -cht, print the count, co-occurring hashtags and "
+              "files of each hashtag as JSON")
+    parser.add_argument('--format', choices=formats.FORMATS, default='text'
+              , help="write one record per file: jsonl (a json object per "
+              "line), csv, or bib - the whole entry of each file with a file "
+              "tag, which rset.py -m can read back in (default %(default)s)")
+    parser.add_argument('-x', '--exclude', action='append', default=[]
+              , metavar=('GLOB'), help="skip files and directories matching GLOB")
+    parser.add_argument('-L', '--follow-symlinks', action='store_true'
+                            , help="recurse into symlinked sub-directories too")
+    parser.add_argument('--max-depth', type=int, metavar=('N')
+                           , help="recurse at most N sub-directories deep")
+    parser.add_argument('-j', '--jobs', type=int, default=1, metavar=('N')
+                                        , help="read N files at a time")
+    parser.add_argument('--no-cache', action='store_true'
+                   , help="read every BibTeX entry from its file, bypassing the "
+                   "catalog")
+    parser.add_argument('--rebuild-cache', action='store_true'
+                   , help="discard the catalog and rebuild it during this run")
+    parser.add_argument('--no-daemon', action='store_true'
+                   , help="run in this process even if rdaemon.py is running")
+    stats.add_arguments(parser)
+    parser.add_argument('target', nargs='*', default=['.']
+                                 , help="files (or directories containing them) "
+                                 "with BibTeX entries to be printed")
+    return parser
+
+def main(argv=None, library=None, *, prog='rshow.py') -> int:
+    """ :param library: a Library to show, by default built from argv
+        :returns: exit status
+    """
+    parser = build_parser(prog)
+    args = parser.parse_args(argv)
+    if args.collatehashtags and args.format != 'text':
+        parser.error("-cht has no --format, see --json")
+    if library is None:
+        library = Library.from_args(args)
+
+    with stats.session(args):
+        try:
+            return show(args, library)
+        except BrokenPipeError: # e.g. piped to head
+            return formats.stdout_closed()
@@ -0,0 +1,245 @@
+# written by nathan sinclair
+
+import sys, os, errno
+
+from argparse import ArgumentParser
+
+from . import formats
+from . import stats
+from .library import Library
+from .parallel import FILE_ERRORS, Report, imap_ordered
+from .query import Candidate, QueryError, compile_args
+
+def search_file(filepath, args, library) -> Report:
+    """ Match one file against the compiled query args.plan
+        :returns: the Report to be printed for filepath
+    """
+    report = Report()
+    try:
+        if not filepath.exists():
+            raise FileNotFoundError(errno.ENOENT, os.strerror(errno.ENOENT)
+                                                                 , filepath)
+        candidate = Candidate(filepath, library, args.fields)
+        if args.plan is not None and args.plan.test(candidate):
+            report.print(filepath, flush=True)
+            # the same tag may be shown for several terms
+            if result := "".join(dict.fromkeys(args.plan.report(candidate))):
+                report.print(result, file=sys.stderr)
+
+    except FILE_ERRORS as e:
+        report.record_error(e, filepath)
+    return report
+
+# the csv columns of --format csv, a row per match
+MATCH_COLUMNS = ('path', 'field', 'note', 'start', 'end', 'match')
+
+def hit_records(filepath, args, library):
+    """ Match one file against args.plan for output in args.format
+        :returns: tuple (list of records, Report of any problem) - a jsonl
+                  record lists all matches of the file, csv has one per match
+    """
+    report = Report()
+    try:
+        if not filepath.exists():
+            raise FileNotFoundError(errno.ENOENT, os.strerror(errno.ENOENT)
+                                                                 , filepath)
+        candidate = Candidate(filepath, library, args.fields)
+        if args.plan is None or not args.plan.test(candidate):
+            return [], report
+        if args.format == 'bib':
+            if candidate.bib is None: # matched on its notes
+                return [], report
+            return [formats.file_entry(candidate.bib, filepath)], report
+        # the same match may be found for several terms
+        matches = [dict(match) for match in dict.fromkeys(tuple(match.items())
+                                  for match in args.plan.matches(candidate))]
+        if args.format == 'jsonl':
+            return [{'path': str(filepath), 'matches': matches}], report
+        return [{'path': str(filepath), **match}
+                                for match in matches or [{}]], report
+
+    except FILE_ERRORS as e:
+        report.record_error(e, filepath)
+    return [], report
+
+def index_candidates(files, args, index, library) -> list:
+    """ Bring the index up to date for files and drop those that it shows
+        cannot match args - search_file still decides on the rest
+    """
+    def refresh(filepath):
+        try:
+            index.refresh(filepath, library.entry, library.notes)
+        except FILE_ERRORS:
+            return True # keep: search_file reports the problem
+        return False
+
+    files = list(files)
+    broken = {filepath for filepath, failed in zip(files
+                          , imap_ordered(refresh, files, args.jobs)) if failed}
+
+    keep = args.plan.candidates(index) if args.plan is not None else None
+    if keep is None:
+        return files
+    return [filepath for filepath in files
+                      if filepath in broken
+                                  or library.catalog.key(filepath) in keep]
+
+def search(args, library) -> int:
+    """ :returns: exit status of the search args asks for """
+    def search_timed(filepath):
+        with stats.current.file(filepath):
+            return search_file(filepath, args, library)
+
+    files = library.walk(args.target, recursive=args.recursive
+                       , exclude=args.exclude, follow_symlinks=args.follow_symlinks
+                       , max_depth=args.max_depth)
+    if args.index and library.catalog is not None: # else no catalog to index
+        from .search_index import SearchIndex # deferred, as for entry_keys
+        with stats.current.phase('index'):
+            files = index_candidates(files, args
+                    , SearchIndex(library.catalog, rebuild=args.rebuild_cache)
+                    , library)
+
+    if args.format != 'text':
+        return export(files, args, library)
+    exit_status = 0
+    for report in imap_ordered(search_timed, files, args.jobs):
+        report.replay()
+        if report.error and not exit_status:
+            exit_status = getattr(report.error, 'errno', None) or 1
+    return exit_status
+
+def export(files, args, library) -> int:
+    """ Write the hits among files in args.format
+        :returns: exit status
+    """
+    def records_timed(filepath):
+        with stats.current.file(filepath):
+            return hit_records(filepath, args, library)
+
+    def records():
+        nonlocal exit_status
+        for file_records, report in imap_ordered(records_timed, files
+                                                               , args.jobs):
+            report.replay()
+            if report.error and not exit_status:
+                exit_status = getattr(report.error, 'errno', None) or 1
+            yield from file_records
+
+    exit_status = 0
+    formats.writer(args.format, MATCH_COLUMNS).write_all(records())
+    return exit_status
+
+def duplicates(args, library) -> int:
+    """ Report the files in args.target sharing a citekey, a DOI or a title
+        :returns: exit status
+    """
+    # deferred: of the searches only this one needs it
+    from .entry_keys import find_duplicates
+
+    def read(filepath):
+        report = Report()
+        try:
+            return (filepath, library.entry(filepath)), report
+        except FILE_ERRORS as e:
+            report.record_error(e, filepath)
+        return (filepath, None), report
+
+    def entries():
+        nonlocal exit_status
+        for entry, report in imap_ordered(read, files, args.jobs):
+            report.replay()
+            if report.error and not exit_status:
+                exit_status = getattr(report.error, 'errno', None) or 1
+            yield entry
+
+    files = library.walk(args.target, recursive=args.recursive
+                       , exclude=args.exclude, follow_symlinks=args.follow_symlinks
+                       , max_depth=args.max_depth)
+    exit_status = 0
+    for (kind, key), filepaths in find_duplicates(entries()).items():
+        print(f"{kind} {key}:")
+        for filepath in filepaths:
+            print(f"\t{filepath}")
+    return exit_status
+
+def build_parser(prog='rsrch.py') -> ArgumentParser:
+    parser = ArgumentParser(prog=prog)
+    parser.add_argument('-r', '--recursive', action='store_true'
+                                         , help="recurse on each sub-directory")
+    parser.add_argument('-a', '--all', action='store_true'
+                            , help="search for conjunction of all search terms")
+    parser.add_argument('-ck', '--citekey', metavar=('CITEKEY')
+                                                    , help="search for CITEKEY")
+    parser.add_argument('-t', '--tag', nargs=2, action='append'
+                          , metavar=('TAG','VALUE')
+                          , help="search for VALUE in TAG in each BibTeX entry")
+    parser.add_argument('-n', '--notes', metavar=('REGEX')
+                                       , help="search for REGEX in annotations")
+    parser.add_argument('-q', '--query', metavar=('QUERY')
+              , help="search for files matching QUERY: terms FIELD:TEXT "
+              "(TEXT in FIELD, ignoring case), FIELD~REGEX, has:FIELD, "
+              "notes:TEXT or notes~REGEX combined with and, or, not and "
+              "parentheses - e.g. 'year:2019 (title~[Gg]enom or "
+              "notes:ribosome) not has:doi'")
+    parser.add_argument('--find-duplicates', action='store_true'
+              , help="instead of searching, list the files that share a "
+              "citekey, a DOI or a title (ignoring case, accents and "
+              "punctuation)")
+    parser.add_argument('--format', choices=formats.FORMATS, default='text'
+              , help="write the hits as jsonl (a json object per file, with "
+              "the field or note, offsets and text of each match), csv (a row "
+              "per match) or bib - the whole entry of each file with a file "
+              "tag, which rset.py -m can read back in (default %(default)s)")
+    parser.add_argument('-x', '--exclude', action='append', default=[]
+              , metavar=('GLOB'), help="skip files and directories matching GLOB")
+    parser.add_argument('-L', '--follow-symlinks', action='store_true'
+                            , help="recurse into symlinked sub-directories too")
+    parser.add_argument('--max-depth', type=int, metavar=('N')
+                           , help="recurse at most N sub-directories deep")
+    parser.add_argument('-j', '--jobs', type=int, default=1, metavar=('N')
+                                      , help="search N files at a time")
+    parser.add_argument('--index', action='store_true'
+              , help="narrow the search down with an index of the library, "
+              "updated for files that changed since the last --index search")
+    parser.add_argument('--no-cache', action='store_true'
+                   , help="read every BibTeX entry from its file, bypassing the "
+                   "catalog")
+    parser.add_argument('--rebuild-cache', action='store_true'
+                   , help="discard the catalog and rebuild it during this run")
+    parser.add_argument('--no-daemon', action='store_true'
+                   , help="run in this process even if rdaemon.py is running")
+    stats.add_arguments(parser)
+    parser.add_argument('target', nargs='+'
+                          , help="Directory or file whose BibTeX entry and skim"
+                                               "annotations are to be searched")
+    return parser
+
+def main(argv=None, library=None, *, prog='rsrch.py') -> int:
+    """ :param library: a Library to search, by default built from argv
+        :returns: exit status
+    """
+    parser = build_parser(prog)
+    args = parser.parse_args(argv)
+    if args.index and args.no_cache:
+        parser.error("--index is kept in the catalog, it needs the cache")
+    if library is None:
+        library = Library.from_args(args)
+    try:
+        args.plan = compile_args(args)
+    except QueryError as e:
+        parser.error(str(e))
+    args.fields = args.plan.fields() \
+                    if args.plan is not None and args.format != 'bib' else None
+    if args.find_duplicates and args.plan is not None:
+        parser.error("--find-duplicates does not take search terms")
+    if args.find_duplicates and args.format != 'text':
+        parser.error("--find-duplicates has no --format")
+
+    with stats.session(args):
+        try:
+            if args.find_duplicates:
+                return duplicates(args, library)
+            return search(args, library)
+        except BrokenPipeError: # e.g. piped to head
+            return formats.stdout_closed()
@@ -0,0 +1,135 @@
+# inverted index over the BibTeX tags and skim notes of a library of pdfs
+import os
+import re
+
+from .catalog import Catalog, stamp
+from .skim_notes import NOTE_HEADING_RE
+
+TOKEN_RE = re.compile(r'\w+')
+REGEX_META = frozenset('.^$*+?{}[]\\|()')
+
+def tokens(text:str):
+    """ :yields: tuple (position, normalized token) for each word in text """
+    return enumerate(TOKEN_RE.findall(text.casefold()))
+
+def _like_escape(token:str) -> str:
+    return token.replace('\\', '\\\\').replace('_', '\\_').replace('%', '\\%')
+
+class SearchIndex:
+    """ Postings (token, file, field or note heading, position) kept in the
+        catalog database and refreshed file by file when a file's stamp changes
+        The index only narrows a search down to candidate files: every
+        candidate is still checked in full, so results match a full scan.
+    """
+    SCHEMA = {
+        'indexed': ('CREATE TABLE IF NOT EXISTS indexed (path TEXT PRIMARY KEY'
+                   ', ino INTEGER, size INTEGER, mtime INTEGER, ctime INTEGER'
+                   ', entry INTEGER, notes INTEGER)',) # 1 if the file has them
+        # note is 1 for postings from skim notes, where field is the heading
+      , 'postings': ('CREATE TABLE IF NOT EXISTS postings (token TEXT'
+                     ', path TEXT, field TEXT, note INTEGER, pos INTEGER)'
+                    , 'CREATE INDEX IF NOT EXISTS postings_token ON '
+                                                  'postings (token, field, note)'
+                    , 'CREATE INDEX IF NOT EXISTS postings_path ON '
+                                                              'postings (path)')
+        # every token ever indexed - scanned for tokens containing a fragment
+      , 'vocabulary': ('CREATE TABLE IF NOT EXISTS vocabulary (token TEXT '
+                                                   'PRIMARY KEY) WITHOUT ROWID',)
+    }
+
+    def __init__(self, catalog:Catalog, *, rebuild=False):
+        self.catalog = catalog
+        catalog.create_tables(self.SCHEMA, rebuild=rebuild)
+
+    def refresh(self, filepath, read_entry, read_notes, st=None) -> bool:
+        """ Reindex filepath if it changed since it was last indexed
+            :param read_entry: callable returning the BibTeXEntry of a file
+            :param read_notes: callable returning the text notes of a file
+            :returns: whether filepath had to be reindexed
+        """
+        key = self.catalog.key(filepath)
+        if st is None:
+            st = getattr(filepath, 'st', None) or os.stat(key)
+        row = self.catalog.execute('SELECT ino, size, mtime, ctime FROM indexed'
+                                                       ' WHERE path = ?', (key,))
+        if row and tuple(row[0]) == stamp(st):
+            return False
+
+        postings = []
+        if bib := read_entry(filepath):
+            fields = {**bib.tags(), 'citekey': bib.citekey, 'type': bib.type}
+            for field, value in fields.items():
+                postings.extend((token, key, field, 0, pos)
+                                              for pos, token in tokens(value))
+        notes = NOTE_HEADING_RE.split(read_notes(filepath))[1:]
+        note_iter = iter(notes)
+        for heading, note in zip(note_iter, note_iter):
+            postings.extend((token, key, heading, 1, pos)
+                                              for pos, token in tokens(note))
+
+        self.catalog.execute('DELETE FROM postings WHERE path = ?', (key,))
+        self.catalog.executemany('INSERT INTO postings VALUES (?, ?, ?, ?, ?)'
+                                                                    , postings)
+        self.catalog.executemany('INSERT OR IGNORE INTO vocabulary VALUES (?)'
+                                     , {(posting[0],) for posting in postings})
+        self.catalog.execute('INSERT OR REPLACE INTO indexed VALUES (?, ?, ?, ?'
+                             ', ?, ?, ?)', (key, *stamp(st), int(bib is not None)
+                                                            , int(bool(notes))))
+        return True
+
+    def _files_with(self, token:str, exact_start:bool, exact_end:bool
+                                                , field=None, note=False) -> set:
+        """ :returns: paths of the files with a token in field (or in any note
+                      heading if note) that equals, starts with, ends with or
+                      contains token according to exact_start and exact_end
+        """
+        where, params = ['note = ?'], [int(note)]
+        if field is not None:
+            where.append('field = ?')
+            params.append(field)
+        if exact_start and exact_end:
+            where.append('token = ?')
+            params.append(token)
+        elif exact_start: # prefix - a range scan of the token index
+            where.append('token >= ? AND token < ?')
+            params.extend((token, token + '\U0010ffff'))
+        else:
+            pattern = '%' + _like_escape(token) + ('' if exact_end else '%')
+            where.append("token IN (SELECT token FROM vocabulary "
+                                              "WHERE token LIKE ? ESCAPE '\\')")
+            params.append(pattern)
+        return {row[0] for row in self.catalog.execute(
+                  'SELECT DISTINCT path FROM postings WHERE ' + ' AND '.join(where)
+                                                                       , params)}
+
+    def substring_candidates(self, term:str, field=None, note=False):
+        """ :returns: the paths of all files where term.casefold() may be a
+                      substring of field, or None if the index cannot tell
+        """
+        term = term.casefold()
+        matches = list(TOKEN_RE.finditer(term))
+        if not matches:
+            return None
+        result = None
+        for i, match in enumerate(matches):
+            # a query token bounded by a non-word character, or by another
+            # query token, must match the start/end of an indexed token
+            exact_start = i > 0 or match.start() > 0
+            exact_end = i < len(matches) - 1 or match.end() < len(term)
+            files = self._files_with(match.group(), exact_start, exact_end
+                                                                 , field, note)
+            result = files if result is None else result & files
+            if not result:
+                break
+        return result
+
+    def note_candidates(self, pattern:str):
+        """ :returns: the paths of all files whose notes may match pattern """
+        if REGEX_META.isdisjoint(pattern) and TOKEN_RE.search(pattern):
+            return self.substring_candidates(pattern, note=True)
+        return {row[0] for row in self.catalog.execute(
+                                      'SELECT path FROM indexed WHERE notes = 1')}
+
+    def files_without_entry(self) -> set:
+        return {row[0] for row in self.catalog.execute(
+                                      'SELECT path FROM indexed WHERE entry = 0')}
@@ -0,0 +1,240 @@
+# in-process reader for the annotations skim stores in extended attributes
+# modules only some files need are imported where they are used, keeping
+# them out of the startup of tools that never read notes
+import errno
+import os
+import re
+import zlib
+
+from . import stats
+
+NOTES_KEY = 'net_sourceforge_skim-app_notes'
+TEXT_NOTES_KEY = 'net_sourceforge_skim-app_text_notes'
+# attributes too large for a single xattr are split into fragments that are
+# named by a wrapper plist stored under the original name
+WRAPPER_KEY = 'net_sourceforge_skim-app_has_wrapper'
+UNIQUE_KEY = 'net_sourceforge_skim-app_unique_key'
+FRAGMENTS_KEY = 'net_sourceforge_skim-app_number_of_fragments'
+# the heading render_text starts each note with
+NOTE_HEADING_RE = re.compile(r'^\* ([\w ]*, page \d+)$', flags=re.MULTILINE)
+
+class NotesFormatError(ValueError): pass
+
+def _decompress(data:bytes) -> bytes:
+    try:
+        if data[:3] == b'BZh':
+            import bz2
+            return bz2.decompress(data)
+        if data[:2] == b'\x1f\x8b':
+            import gzip
+            return gzip.decompress(data)
+    # corrupt data raises OSError too, but one without an errno
+    except (OSError, EOFError, ValueError, zlib.error) as e:
+        raise NotesFormatError(f"corrupt compressed notes: "
+                                        f"{str(e) or type(e).__name__}") from e
+    return data
+
+def _plist(data:bytes):
+    """ :returns: the decoded property list or None if data is not one """
+    if not (data.startswith(b'bplist') or data.lstrip().startswith(b'<?xml')):
+        return None
+    import plistlib
+    try:
+        return plistlib.loads(data)
+    except (plistlib.InvalidFileException, ValueError) as e:
+        raise NotesFormatError(str(e)) from e
+
+def read_attribute(x_, name:str):
+    """ Reassemble and decompress one of skim's extended attributes
+        :param x_: an xattr object for the file
+        :returns: the raw attribute bytes or None if it is not set
+    """
+    if not x_.has_key(name):
+        return None
+    data = _decompress(stats.current.read_xattr(x_.get(name)))
+    wrapper = _plist(data)
+    if isinstance(wrapper, dict) and wrapper.get(WRAPPER_KEY):
+        unique = wrapper[UNIQUE_KEY]
+        data = _decompress(b''.join(
+                          stats.current.read_xattr(x_.get(f'{unique}-{i}'))
+                                for i in range(wrapper[FRAGMENTS_KEY])))
+    return data
+
+def _unarchive(archive:dict):
+    """ Decode the subset of NSKeyedArchiver output skim notes are made of """
+    from plistlib import UID
+    objects = archive['$objects']
+    memo = {}
+
+    def decode(ref):
+        if not isinstance(ref, UID):
+            return ref
+        if ref.data in memo:
+            return memo[ref.data]
+        obj = objects[ref.data]
+        if isinstance(obj, str) and obj == '$null':
+            result = None
+        elif not isinstance(obj, dict) or '$class' not in obj:
+            result = obj
+        else:
+            classname = objects[obj['$class'].data]['$classname']
+            if 'NS.keys' in obj:
+                result = {decode(k): decode(v)
+                              for k, v in zip(obj['NS.keys'], obj['NS.objects'])}
+            elif 'NS.objects' in obj:
+                result = [decode(v) for v in obj['NS.objects']]
+            elif 'NS.string' in obj:
+                result = obj['NS.string']
+            elif 'NSString' in obj: # NSAttributedString - keep only the text
+                result = decode(obj['NSString'])
+            elif 'NS.time' in obj or 'NS.data' in obj:
+                result = obj.get('NS.time', obj.get('NS.data'))
+            else: # colours, rects etc. are not needed to render text
+                result = classname
+        memo[ref.data] = result
+        return result
+
+    try:
+        return decode(archive['$top']['root'])
+    except (KeyError, IndexError, AttributeError, TypeError) as e:
+        raise NotesFormatError(f"malformed keyed archive: {e!r}") from e
+
+# control words that stand for text, everything else in rtf is formatting
+RTF_TOKEN_RE = re.compile(r"\\([a-z]+)(-?\d+)? ?|\\'([0-9a-fA-F]{2})|\\(.)|([{}])"
+                                   r"|([^\\{}\r\n]+)|[\r\n]+", flags=re.DOTALL)
+RTF_SYMBOLS = {'\r': '\n', '\n': '\n', '~': '\xa0', '-': '', '_': '\u2011'}
+RTF_TEXT = {'par': '\n', 'line': '\n', 'tab': '\t', 'emdash': '\u2014'
+           , 'endash': '\u2013', 'lquote': '\u2018', 'rquote': '\u2019'
+           , 'ldblquote': '\u201c', 'rdblquote': '\u201d', 'bullet': '\u2022'}
+RTF_DESTINATIONS = {'fonttbl', 'colortbl', 'stylesheet', 'info', 'pict'
+                   , 'expandedcolortbl', 'listtable', 'listoverridetable'}
+
+def rtf_to_text(rtf:str) -> str:
+    """ Strip formatting from the rtf skim uses for the text of anchored notes
+    """
+    out = []
+    skip_depth = None # depth of the group being skipped, if any
+    depth = 0
+    ignorable = False # set by \* - the next destination may be skipped
+    uc = 1            # fallback characters following each \u, set by \uc
+    uc_skip = 0       # fallback characters still to drop after a \u
+    surrogates = False
+    for match in RTF_TOKEN_RE.finditer(rtf):
+        word, arg, hexcode, symbol, brace, text = match.groups()
+        if brace == '{':
+            depth += 1
+            continue
+        if brace == '}':
+            if skip_depth == depth:
+                skip_depth = None
+            depth -= 1
+            continue
+        if skip_depth is not None:
+            continue
+        if symbol == '*':
+            ignorable = True
+            continue
+        if word is not None:
+            if ignorable or word in RTF_DESTINATIONS:
+                skip_depth = depth
+            elif word == 'u':
+                out.append(chr(int(arg) % 0x10000))
+                uc_skip = uc
+                surrogates = surrogates or 0xd800 <= int(arg) % 0x10000 < 0xe000
+            elif word == 'uc':
+                uc = int(arg or 1)
+            elif word in RTF_TEXT:
+                out.append(RTF_TEXT[word])
+            ignorable = False
+            continue
+        if uc_skip and (hexcode or text):
+            if not text:
+                uc_skip -= 1
+                continue
+            text, uc_skip = text[uc_skip:], max(uc_skip - len(text), 0)
+        if hexcode:
+            out.append(bytes.fromhex(hexcode).decode('cp1252', 'replace'))
+        elif symbol:
+            out.append(RTF_SYMBOLS.get(symbol, symbol))
+        elif text:
+            out.append(text)
+    if surrogates: # characters beyond the BMP come as two \u, join them
+        return ''.join(out).encode('utf-16', 'surrogatepass').decode('utf-16'
+                                                                   , 'replace')
+    return ''.join(out)
+
+def read_notes(filepath) -> list:
+    """ :returns: skim's note dictionaries for filepath ([] if none)
+        :raises NotesFormatError: if the attribute cannot be decoded
+    """
+    from xattr import xattr
+    data = read_attribute(xattr(os.fspath(filepath)), NOTES_KEY)
+    if not data:
+        return []
+    notes = _plist(data)
+    if isinstance(notes, dict) and notes.get('$archiver') == 'NSKeyedArchiver':
+        notes = _unarchive(notes)
+    if not isinstance(notes, list):
+        raise NotesFormatError(f"unexpected notes payload in '{filepath}'")
+    return notes
+
+def _note_text(text) -> str:
+    if isinstance(text, bytes): # plist format stores the text as rtf data
+        return rtf_to_text(text.decode('latin-1')) if text[:5] == b'{\\rtf'\
+                                                         else text.decode()
+    return text or ''
+
+def render_text(notes:list) -> str:
+    """ Lay notes out as `skimnotes get -format text` does:
+            * Type, page N
+
+            contents
+
+    """
+    parts = []
+    for note in notes:
+        page = note.get('pageIndex', 0)
+        if not isinstance(page, int) or page >= 0x7fffffff: # NSNotFound
+            page = 0
+        parts.append(f"* {note.get('type', 'Note')}, page {page + 1}\n\n")
+        for text in (note.get('contents'), _note_text(note.get('text'))):
+            if text and isinstance(text, str):
+                parts.append(f"{text} \n\n")
+    return ''.join(parts)
+
+def _skimnotes_text(filepath) -> str:
+    import subprocess
+    with stats.current.phase('skimnotes'):
+        return subprocess.run(
+                     ['skimnotes', 'get', '-format', 'text', filepath, '-']
+                     , text=True, capture_output=True
+                    ).stdout
+
+def text_notes(filepath) -> str:
+    """ Text of the skim notes attached to filepath, read without spawning
+        `skimnotes` unless the attributes are in a format not understood here
+        :returns: the notes laid out as by render_text ('' if none)
+        :raises NotesFormatError: if the attributes cannot be decoded and
+                                  there is no skimnotes to fall back on
+    """
+    from shutil import which
+    from xattr import xattr
+    try:
+        x_ = xattr(os.fspath(filepath))
+        if (data := read_attribute(x_, TEXT_NOTES_KEY)) is not None:
+            # skim stores the text as a property list string
+            return text if isinstance(text := _plist(data), str)\
+                                                           else data.decode()
+        return render_text(read_notes(filepath))
+    except OSError as e:
+        if e.errno in (errno.ENOTSUP, errno.EOPNOTSUPP): # no xattrs, no notes
+            return ''
+        if isinstance(e, FileNotFoundError) or not which('skimnotes'):
+            raise
+    except NotesFormatError:
+        if not which('skimnotes'):
+            raise
+    except UnicodeDecodeError as e:
+        if not which('skimnotes'):
+            raise NotesFormatError(str(e) or type(e).__name__) from e
+    return _skimnotes_text(filepath)
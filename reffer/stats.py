@@ -0,0 +1,178 @@
+# opt-in instrumentation shared by the tools: --stats, --stats-json, --profile
+# Code being measured calls `stats.current`, which is a do-nothing NullStats
+# unless a session is running, so the cost when off is an attribute lookup
+import atexit
+import heapq
+import sys
+import threading
+import time
+
+from contextlib import contextmanager, nullcontext
+
+class Stats:
+    """ Wall and CPU time and call count of each phase of a run, the slowest
+        files and the bytes read from extended attributes
+        Phases may nest (parse happens within entry), so their times overlap.
+        CPU time is that of the thread doing the work.
+    """
+    def __init__(self, slowest:int=10):
+        self.slowest = slowest
+        self.phases = {}      # name: [calls, wall seconds, cpu seconds]
+        self.files = []       # heap of (seconds, path) of the slowest files
+        self.xattr_bytes = 0
+        self.xattr_reads = 0
+        self._lock = threading.Lock()
+        self._wall, self._cpu = time.perf_counter(), time.process_time()
+
+    @contextmanager
+    def phase(self, name:str):
+        wall, cpu = time.perf_counter(), time.thread_time()
+        try:
+            yield
+        finally:
+            wall, cpu = time.perf_counter() - wall, time.thread_time() - cpu
+            with self._lock:
+                totals = self.phases.setdefault(name, [0, 0.0, 0.0])
+                totals[0] += 1
+                totals[1] += wall
+                totals[2] += cpu
+
+    def timed(self, name:str, iterable):
+        """ :yields: the items of iterable, timing the production of each as
+                     phase name
+        """
+        iterator = iter(iterable)
+        while True:
+            with self.phase(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    @contextmanager
+    def file(self, filepath):
+        """ Count the time the body takes towards the slowest files """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._file_done(filepath, time.perf_counter() - start)
+
+    def _file_done(self, filepath, seconds:float) -> None:
+        with self._lock:
+            if len(self.files) < self.slowest:
+                heapq.heappush(self.files, (seconds, str(filepath)))
+            elif seconds > self.files[0][0]:
+                heapq.heapreplace(self.files, (seconds, str(filepath)))
+
+    def read_xattr(self, data:bytes) -> bytes:
+        """ Count data as read from an extended attribute
+            :returns: data
+        """
+        with self._lock:
+            self.xattr_reads += 1
+            self.xattr_bytes += len(data)
+        return data
+
+    def to_dict(self) -> dict:
+        return {'wall': time.perf_counter() - self._wall
+              , 'cpu': time.process_time() - self._cpu
+              , 'phases': {name: {'calls': calls, 'wall': wall, 'cpu': cpu}
+                          for name, (calls, wall, cpu) in self.phases.items()}
+              , 'slowest_files': [{'path': path, 'wall': seconds}
+                            for seconds, path in sorted(self.files, reverse=True)]
+              , 'xattr_reads': self.xattr_reads
+              , 'xattr_bytes': self.xattr_bytes}
+
+    def format(self) -> str:
+        stats = self.to_dict()
+        lines = [f"total: {stats['wall']:.3f}s wall, {stats['cpu']:.3f}s cpu"
+                , f"{'phase':>12} {'calls':>8} {'wall':>9} {'cpu':>9}"]
+        for name, phase in sorted(stats['phases'].items()
+                                        , key=lambda item: -item[1]['wall']):
+            lines.append(f"{name:>12} {phase['calls']:>8} {phase['wall']:8.3f}s "
+                                                           f"{phase['cpu']:8.3f}s")
+        lines.append(f"xattrs read: {stats['xattr_reads']} "
+                                              f"({stats['xattr_bytes']} bytes)")
+        if stats['slowest_files']:
+            lines.append("slowest files:")
+            lines.extend(f"\t{file_['wall'] * 1e3:8.2f} ms  {file_['path']}"
+                                             for file_ in stats['slowest_files'])
+        return '\n'.join(lines)
+
+class NullStats:
+    """ Stands in for Stats when no statistics are wanted """
+    _NULL_CONTEXT = nullcontext()
+
+    def phase(self, name:str):
+        return self._NULL_CONTEXT
+
+    def timed(self, name:str, iterable):
+        return iterable
+
+    def file(self, filepath):
+        return self._NULL_CONTEXT
+
+    def read_xattr(self, data:bytes) -> bytes:
+        return data
+
+current = NullStats()
+_profile = None
+
+def add_arguments(parser) -> None:
+    """ Add the --stats, --stats-json and --profile options to parser """
+    parser.add_argument('--stats', action='store_true'
+              , help="print the time spent in each phase, the slowest files "
+              "and the bytes read from extended attributes to stderr")
+    parser.add_argument('--stats-json', metavar=('FILE')
+              , help="write the --stats figures to FILE as json ('-' for stderr)")
+    parser.add_argument('--profile', metavar=('FILE')
+              , help="write cProfile output for the main thread to FILE")
+
+def start(args, *, at_exit=False) -> None:
+    """ Start collecting statistics if args asks for them
+        :param args: parsed add_arguments options
+        :param at_exit: report them when the interpreter exits, for scripts
+                        that may leave through sys.exit
+    """
+    global current, _profile
+    if not (args.stats or args.stats_json or args.profile):
+        return
+    current = Stats()
+    if args.profile:
+        import cProfile
+        _profile = cProfile.Profile()
+        _profile.enable()
+    if at_exit:
+        atexit.register(finish, args)
+
+def finish(args) -> None:
+    """ Report what was collected since start(args) and stop collecting """
+    global current, _profile
+    if _profile is not None:
+        _profile.disable()
+        _profile.dump_stats(args.profile)
+        _profile = None
+    if isinstance(current, NullStats):
+        return
+    if args.stats:
+        print(current.format(), file=sys.stderr)
+    if args.stats_json:
+        import json # deferred: most runs have no --stats-json
+        data = json.dumps(current.to_dict(), indent=2)
+        if args.stats_json == '-':
+            print(data, file=sys.stderr)
+        else:
+            with open(args.stats_json, 'w') as json_file:
+                json_file.write(data + '\n')
+    current = NullStats()
+
+@contextmanager
+def session(args):
+    """ Collect statistics while the body runs if args asks for them """
+    start(args)
+    try:
+        yield
+    finally:
+        finish(args)
@@ -0,0 +1,110 @@
+# scandir based traversal of the pdfs in a library, shared by the tools
+import os
+import stat
+
+from fnmatch import fnmatchcase
+from pathlib import Path
+
+class LibraryFile:
+    """ A file found by walk(), usable wherever a path is expected
+        st holds the stat taken while walking (None if the file could not be
+        stat'ed) so later stages need not stat the file again
+    """
+    __slots__ = ('path', 'name', 'st')
+
+    def __init__(self, path:str, st=None):
+        self.path = path
+        self.name = os.path.basename(path)
+        self.st = st
+
+    def __fspath__(self):
+        return self.path
+
+    def __str__(self):
+        return self.path
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.path!r})"
+
+    def exists(self) -> bool:
+        return self.st is not None
+
+    def stat(self) -> os.stat_result:
+        if self.st is None:
+            self.st = os.stat(self.path) # raises if it still does not exist
+        return self.st
+
+def _join(top:str, name:str) -> str:
+    return name if top == '.' else os.path.join(top, name) # as pathlib does
+
+def _scandir(top:str) -> list:
+    with os.scandir(top) as it_:
+        return list(it_)
+
+def walk(targets, *, recursive=False, pattern='*.pdf', exclude=()
+                , follow_symlinks=False, max_depth=None, scandir=_scandir):
+    """ Yield each file in targets, or matching pattern in a directory in
+        targets, once - however many targets or symlinks lead to it
+        :param recursive: descend into sub-directories
+        :param exclude: globs; files and directories matching any of them by
+                        name or by path relative to their target are skipped
+        :param follow_symlinks: descend into symlinked sub-directories
+        :param max_depth: how many levels of sub-directories to descend into
+        :param scandir: returns the os.DirEntry objects of a directory - the
+                        daemon passes one that caches them
+        :yields: LibraryFile objects in the same order as Path.glob
+    """
+    seen = set() # (st_dev, st_ino) of every file and directory visited
+
+    def excluded(name, relpath):
+        return any(fnmatchcase(name, glob_) or fnmatchcase(relpath, glob_)
+                                                         for glob_ in exclude)
+
+    def scan(top, relative, depth):
+        try:
+            entries = scandir(top)
+        except OSError: # like Path.glob, skip what cannot be listed
+            return
+        subdirs = []
+        for entry in entries:
+            relpath = _join(relative, entry.name)
+            if exclude and excluded(entry.name, relpath):
+                continue
+            try:
+                if entry.is_dir(follow_symlinks=follow_symlinks):
+                    subdirs.append((entry, relpath))
+                    continue
+                if not fnmatchcase(entry.name, pattern):
+                    continue
+                st = entry.stat()
+            except OSError: # vanished or dangling symlink
+                continue
+            if (st.st_dev, st.st_ino) not in seen:
+                seen.add((st.st_dev, st.st_ino))
+                yield LibraryFile(_join(top, entry.name), st)
+
+        if not recursive or (max_depth is not None and depth >= max_depth):
+            return
+        for entry, relpath in subdirs:
+            try:
+                st = entry.stat(follow_symlinks=follow_symlinks)
+            except OSError:
+                continue
+            if (st.st_dev, st.st_ino) not in seen: # symlink loops end here
+                seen.add((st.st_dev, st.st_ino))
+                yield from scan(_join(top, entry.name), relpath, depth + 1)
+
+    for target in targets:
+        top = str(Path(target))
+        try:
+            st = os.stat(top)
+        except OSError:
+            yield LibraryFile(top) # the caller reports that it is missing
+            continue
+        if (st.st_dev, st.st_ino) in seen:
+            continue
+        seen.add((st.st_dev, st.st_ino))
+        if stat.S_ISDIR(st.st_mode):
+            yield from scan(top, '.', 0)
+        else:
+            yield LibraryFile(top, st)
@@ -0,0 +1,145 @@
+# BibTeXEntry.from_str, the serializations it must read back exactly, and
+# read_entries over strings, file objects and mmaps
+import io
+import mmap
+
+import pytest
+
+from reffer.bibtex_entry import BibTeXEntry, FormatError
+
+ENTRY = BibTeXEntry({'type': 'article', 'citekey': 'watson1953'
+                    , 'author': 'Watson, J. D. and Crick, F. H. C.'
+                    , 'title': 'The {DNA} of {Model {Nested}} systems'
+                    , 'journal': 'Nature', 'year': '1953', 'pages': '737--738'
+                    , 'abstract': 'café "quoted" back\\slash, comma = sign'
+                    , 'note': '', '@type': 'Letter'})
+
+@pytest.mark.parametrize('serialize', [str, repr])
+def test_round_trip(serialize):
+    bib = BibTeXEntry.from_str(serialize(ENTRY))
+    assert bib.to_dict() == ENTRY.to_dict()
+    assert serialize(bib) == serialize(ENTRY)
+    assert str(bib) == str(ENTRY) and repr(bib) == repr(ENTRY)
+
+def test_values():
+    bib = BibTeXEntry.from_str('junk before @inproceedings {key:1-a_b ,\n'
+                               ' title = {a {b {c}} d},\n'
+                               ' booktitle = "in {"}quotes{"}",\n'
+                               ' year = 2020 ,\n'
+                               ' volume = {}\n'
+                               '} junk after')
+    assert bib.to_dict() == {'type': 'inproceedings', 'citekey': 'key:1-a_b'
+                            , 'title': 'a {b {c}} d', 'booktitle': 'in {"}quotes{"}'
+                            , 'year': '2020', 'volume': ''}
+
+def test_end_position():
+    bibstr = '@misc{a, x={1}}\n@misc{b,}'
+    bib, end = BibTeXEntry.from_str(bibstr, return_end=True)
+    assert (bib.citekey, bibstr[end:]) == ('a', '\n@misc{b,}')
+    assert BibTeXEntry.from_str(bibstr, end).citekey == 'b'
+    assert BibTeXEntry.from_str('no entry', return_end=True) == (None, 0)
+
+def test_repeated_tags_keep_the_first():
+    bibstr = '@misc{k, a={1}, b={2}, a={3}}'
+    assert BibTeXEntry.from_str(bibstr).get('a') == '1'
+    partial = BibTeXEntry.from_str(bibstr, fields=['a'])
+    assert partial.get('a') == '1' and partial.get('b') == '2'
+    assert repr(partial) == repr(BibTeXEntry.from_str(bibstr))
+
+def test_type_and_citekey_tags_are_kept():
+    bib = BibTeXEntry.from_str('@techreport{k, type = {Technical Report}'
+                               ', citekey = {other}}')
+    assert (bib.type, bib.citekey) == ('techreport', 'k')
+    assert bib.tags() == {'type': 'Technical Report', 'citekey': 'other'}
+    assert BibTeXEntry(bib.to_dict()).tags() == bib.tags()
+    assert BibTeXEntry.from_str(repr(bib)).tags() == bib.tags()
+
+def test_tags_named_like_attributes():
+    bib = BibTeXEntry.from_str('@misc{k, tags={ml}, to_dict={x}, XATTR_KEY={y}}')
+    assert (bib.get('tags'), bib.get('to_dict'), bib.get('XATTR_KEY')) \
+                                                           == ('ml', 'x', 'y')
+    assert bib.get('') is None and bib.get('encode', '') == ''
+    bib.set('tags', bib.get('tags') + ' vision')
+    bib.set('to_dict', None)
+    assert bib.tags() == {'tags': 'ml vision', 'XATTR_KEY': 'y'}
+    with pytest.raises(AttributeError):
+        getattr(bib, '')
+
+@pytest.mark.parametrize('bibstr, offset, message', [
+    ('@misc{k title={x}}', 8, "expected citekey and ','")
+  , ('@misc{k, title {x}}', 9, "expected tag name or '}'")
+  , ('@misc{k, title={x} year=1}', 19, "expected ',' or '}'")
+  , ('@misc{k, title={x}', 18, "expected ',' or '}'")
+  , ('@misc{k, title={a {b}', 21, "unbalanced '{'")
+  , ('@misc{k, title="a}b"}', 17, "unbalanced '}'")
+  , ('@misc{k, title="a {b}', 21, "unterminated '\"'")
+  , ('@misc{k, title=}', 15, "expected value")
+  , ('@misc{k, title=', 15, "expected value")
+])
+def test_error_offsets(bibstr, offset, message):
+    with pytest.raises(FormatError) as error:
+        BibTeXEntry.from_str(bibstr)
+    assert error.value.args == (offset, message)
+
+def test_partial_parse_defers_errors():
+    bib = BibTeXEntry.from_str('@misc{k, a={1}, b={2', fields=['a'])
+    assert bib.get('a') == '1'
+    with pytest.raises(FormatError):
+        bib.tags()
+
+ENTRIES = [BibTeXEntry({'type': 'misc', 'citekey': f'k{i}', 'title': f'{{T}} {i}'
+                       , 'note': 'éè \U0001f9ec ' * (i % 5)})
+                                                               for i in range(40)]
+BIBSTR = '\n\n'.join(map(str, ENTRIES))
+
+def citekeys(entries) -> list:
+    return [bib.citekey for bib in entries]
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 64, 1 << 20])
+def test_read_entries_in_chunks(chunk_size):
+    expected = citekeys(ENTRIES)
+    assert citekeys(BibTeXEntry.read_entries(BIBSTR)) == expected
+    text = BibTeXEntry.read_entries(io.StringIO(BIBSTR), chunk_size=chunk_size)
+    assert citekeys(text) == expected
+    # multibyte characters split between chunks
+    binary = BibTeXEntry.read_entries(io.BytesIO(BIBSTR.encode())
+                                                       , chunk_size=chunk_size)
+    assert [bib.to_dict() for bib in binary] == [bib.to_dict() for bib in ENTRIES]
+
+def test_read_entries_from_mmap(tmp_path):
+    path = tmp_path / 'library.bib'
+    path.write_text(BIBSTR, encoding='utf-8')
+    with open(path, 'rb') as bibfile:
+        with mmap.mmap(bibfile.fileno(), 0, access=mmap.ACCESS_READ) as source:
+            entries = list(BibTeXEntry.read_entries(source, chunk_size=100))
+    assert citekeys(entries) == citekeys(ENTRIES)
+
+BROKEN = ('@misc{a, x={1}}\n'
+          '@misc{b, x={1} y={2}}\n'    # missing ','
+          '@misc{c, x={1}}\n'
+          '@misc{d, x="unterminated}\n'
+          '@misc{e,}\n')
+
+@pytest.mark.parametrize('chunk_size', [5, 1 << 20])
+def test_read_entries_recovers_from_errors(chunk_size):
+    errors = []
+    entries = BibTeXEntry.read_entries(io.StringIO(BROKEN)
+                                  , on_error=errors.append, chunk_size=chunk_size)
+    assert citekeys(entries) == ['a', 'c', 'e']
+    # offsets count from the start of the source, not of a chunk
+    assert [error.args for error in errors] == [
+        (BROKEN.index('y={2}'), "expected ',' or '}'")
+      , (BROKEN.index('}\n@misc{e'), "unbalanced '}'")]
+
+def test_read_entries_raises_without_on_error():
+    with pytest.raises(FormatError) as error:
+        list(BibTeXEntry.read_entries(io.StringIO(BROKEN), chunk_size=3))
+    assert error.value.args[0] == BROKEN.index('y={2}')
+
+def test_read_entries_reports_an_unterminated_entry_at_the_end():
+    source = '@misc{a, x={1}}\n@misc{b, x={'
+    entries, errors = [], []
+    entries.extend(BibTeXEntry.read_entries(io.StringIO(source)
+                                  , on_error=errors.append, chunk_size=4))
+    assert citekeys(entries) == ['a']
+    assert [error.args for error in errors] == [(len(source), "unbalanced '{'")]
@@ -0,0 +1,105 @@
+# rsrch.py queries: parsing, evaluation against a file's entry and notes,
+# and the order the predicates are tested in
+import re
+
+import pytest
+
+from reffer.bibtex_entry import BibTeXEntry
+from reffer.query import And, Candidate, FieldContains, NotesContains, Or\
+                       , QueryError, parse
+
+class StubLibrary:
+    """ Serves one entry and one set of notes, counting the notes read """
+    def __init__(self, bibstr=None, notes=''):
+        self.bib = bibstr and BibTeXEntry.from_str(bibstr)
+        self._notes = notes
+        self.notes_read = 0
+
+    def entry(self, filepath, fields=None):
+        return self.bib
+
+    def notes(self, filepath):
+        self.notes_read += 1
+        return self._notes
+
+ARTICLE = ('@article{crick1953, title = {Molecular Structure of {Nucleic} Acids}'
+           ', year = {1953}, journal = {Nature}, tags = {dna helix}}')
+NOTES = ("* Highlight, page 3\n\nthe ribosome binds here \n\n"
+         "* Note, page 1\n\nsee Fig. 2 \n\n")
+
+def matches(query:str, bibstr=ARTICLE, notes=NOTES) -> bool:
+    return parse(query).test(Candidate('f.pdf', StubLibrary(bibstr, notes)))
+
+@pytest.mark.parametrize('query, expected', [
+    ('title:nucleic', True)
+  , ('title:NUCLEIC', True)                # text terms ignore case
+  , ('title:helix', False)
+  , ('citekey:crick type:article', True)   # the entry's own fields
+  , ('tags:helix', True)                   # a tag named like a method
+  , ('year~^19[0-4]', False)
+  , ('year~^195', True)
+  , ('has:journal', True)
+  , ('has:doi', False)
+  , ('notes:RIBOSOME', True)
+  , ('notes~Fig\\.\\s\\d', True)
+  , ('notes:nucleic', False)
+  , ('title:"of {Nucleic}"', True)
+  , ("title:'structure of'", True)
+  , ('title:"no such" or year:1953', True)
+  , ('title:"no such" year:1953', False)  # adjacent terms are and'ed
+  , ('year:1953 AND NOT has:doi', True)
+  , ('not (year:1953 or has:doi)', False)
+  , ('has:doi or title:acids notes:ribosome', True) # and binds tighter
+  , ('(has:doi or title:acids) notes:nothing', False)
+  , ('not not has:journal', True)
+])
+def test_evaluation(query, expected):
+    assert matches(query) is expected
+
+def test_quotes_escape_only_themselves():
+    bibstr = r'@misc{k, title = {say "hi" \d}}'
+    assert matches(r'title:"say \"hi\" \d"', bibstr)
+    assert matches(r"title~'\"hi\" \\\\d'", bibstr)
+
+def test_files_without_an_entry():
+    assert not matches('year:1953', bibstr=None)
+    assert matches('not has:title notes:ribosome', bibstr=None)
+
+@pytest.mark.parametrize('query, message', [
+    ('(year:1953', "missing ')' in query")
+  , ('year:1953 or', "expected a search term, not 'the end'")
+  , ('not', "expected a search term, not 'the end'")
+  , ('year:1953)', "unexpected ')' in query")
+  , ('year', "expected a search term, not 'year'")
+  , ('title: x', "unexpected ': x' in query")
+  , ('title~"("', "bad regular expression '('")
+])
+def test_errors(query, message):
+    with pytest.raises(QueryError, match=re.escape(message)):
+        parse(query)
+
+def test_cheap_terms_first():
+    tree = parse('notes:ribosome title:acids')
+    assert isinstance(tree, And)
+    assert list(map(type, tree.children)) == [FieldContains, NotesContains]
+    library = StubLibrary(ARTICLE, NOTES)
+    assert not parse('notes:ribosome title:helix').test(Candidate('f.pdf', library))
+    assert library.notes_read == 0 # decided by the title alone
+
+def test_notes_are_read_once():
+    library = StubLibrary(ARTICLE, NOTES)
+    tree = parse('notes:nothing or notes~bind or notes:fig')
+    assert isinstance(tree, Or) and tree.test(Candidate('f.pdf', library))
+    assert library.notes_read == 1
+
+def test_fields():
+    assert parse('title:a (year:1 or not has:doi) notes:x').fields() \
+                                           == frozenset({'title', 'year', 'doi'})
+
+def test_matches():
+    candidate = Candidate('f.pdf', StubLibrary(ARTICLE, NOTES))
+    assert parse('title:nucleic notes~bind\\w+').matches(candidate) == [
+        {'field': 'title', 'value': 'Molecular Structure of {Nucleic} Acids'
+        , 'start': 24, 'end': 31, 'match': 'Nucleic'}
+      , {'note': 'Highlight, page 3', 'text': 'the ribosome binds here'
+        , 'start': 13, 'end': 18, 'match': 'binds'}]
@@ -0,0 +1,212 @@
+# reads skim notes stored in each of the formats skim writes and compares the
+# text to what `skimnotes get -format text` gives for them, written out by hand
+# so that the decoders are not checked against their own output
+import bz2
+import errno
+import gzip
+import plistlib
+import shutil
+
+from datetime import datetime
+
+import pytest
+
+from reffer.skim_notes import NOTES_KEY, TEXT_NOTES_KEY, WRAPPER_KEY\
+                            , UNIQUE_KEY, FRAGMENTS_KEY, NotesFormatError\
+                            , rtf_to_text, text_notes
+
+xattr = pytest.importorskip('xattr').xattr
+
+NS_NOT_FOUND = 0x7fffffffffffffff
+TEXT = "caf\u00e9 \u2014 {braces} back\\slash\nsecond line \U0001f9ec end"
+# (type, pageIndex, contents, text of an anchored note or None)
+NOTES = (('Highlight', 2, 'binding kinetics #todo', None)
+        , ('Note', 0, 'see the figure', TEXT)
+        , ('Text', NS_NOT_FOUND, 'on no page', None))
+EXPECTED = ("* Highlight, page 3\n\nbinding kinetics #todo \n\n"
+            "* Note, page 1\n\nsee the figure \n\n"
+            "caf\u00e9 \u2014 {braces} back\\slash\nsecond line \U0001f9ec end \n\n"
+            "* Text, page 1\n\non no page \n\n")
+
+def rtf(text:str) -> bytes:
+    """ text as the rtf Cocoa writes for an NSAttributedString """
+    body = []
+    for char in text:
+        if char in '\\{}':
+            body.append('\\' + char)
+        elif char == '\n':
+            body.append('\\\n')
+        elif ord(char) < 0x80:
+            body.append(char)
+        elif ord(char) < 0x100:
+            body.append(f"\\'{ord(char):02x}")
+        else: # as utf-16, with negative numbers for units above 0x7fff
+            units = char.encode('utf-16-le')
+            for i in range(0, len(units), 2):
+                unit = int.from_bytes(units[i:i + 2], 'little')
+                body.append(f"\\uc0\\u{unit - 0x10000 if unit > 0x7fff else unit} ")
+    return ("{\\rtf1\\ansi\\ansicpg1252\\cocoartf2639\n"
+            "\\cocoatextscaling0\\cocoaplatform0{\\fonttbl\\f0\\fswiss"
+            "\\fcharset0 Helvetica;}\n{\\colortbl;\\red255\\green255\\blue255;}\n"
+            "{\\*\\expandedcolortbl;;}\n\\pard\\tx560\\pardirnatural"
+            "\\partightenfactor0\n\n\\f0\\fs24 \\cf0 " + ''.join(body) + "}"
+           ).encode('latin-1')
+
+def plain_notes() -> list:
+    """ the property list format of skim before 1.4, anchored text as rtf """
+    notes = []
+    for type_, page, contents, text in NOTES:
+        note = {'type': type_, 'pageIndex': page, 'contents': contents
+               , 'bounds': '{{72, 600}, {200, 14}}', 'date': datetime(2020, 1, 2)}
+        if text is not None:
+            note['text'] = rtf(text)
+        notes.append(note)
+    return notes
+
+class _Archiver:
+    """ Just enough of NSKeyedArchiver for the objects skim notes hold """
+    def __init__(self):
+        self.objects = ['$null']
+        self._classes = {}
+
+    def _class(self, name:str) -> plistlib.UID:
+        if name not in self._classes:
+            self.objects.append({'$classname': name, '$classes': [name, 'NSObject']})
+            self._classes[name] = plistlib.UID(len(self.objects) - 1)
+        return self._classes[name]
+
+    def _add(self, obj) -> plistlib.UID:
+        self.objects.append(obj)
+        return plistlib.UID(len(self.objects) - 1)
+
+    def encode(self, value):
+        if isinstance(value, int) and not isinstance(value, bool):
+            return value
+        if isinstance(value, str):
+            return self._add(value)
+        if isinstance(value, datetime):
+            return self._add({'NS.time': 600000000.0
+                             , '$class': self._class('NSDate')})
+        if isinstance(value, list):
+            obj = {'NS.objects': [self.encode(v) for v in value]}
+            return self._add({**obj, '$class': self._class('NSMutableArray')})
+        if isinstance(value, dict):
+            obj = {'NS.keys': [self.encode(k) for k in value]
+                  , 'NS.objects': [self.encode(v) for v in value.values()]}
+            return self._add({**obj, '$class': self._class('NSDictionary')})
+        raise TypeError(type(value))
+
+    def attributed(self, text:str) -> plistlib.UID:
+        attributes = self._add({'NSColor': self._add({'NSRGB': b'0 0 0'
+                                   , 'NSColorSpace': 2
+                                   , '$class': self._class('NSColor')})
+                               , '$class': self._class('NSDictionary')})
+        return self._add({'NSString': self.encode(text)
+                         , 'NSAttributes': attributes
+                         , '$class': self._class('NSAttributedString')})
+
+def keyed_notes() -> dict:
+    """ the NSKeyedArchiver format of skim 1.4 on, anchored text attributed """
+    archiver = _Archiver()
+    refs = []
+    for type_, page, contents, text in NOTES:
+        keys = ['type', 'pageIndex', 'contents', 'color', 'date']
+        values = [archiver.encode(type_), page, archiver.encode(contents)
+                 , archiver._add({'NSRGB': b'1 1 0', 'NSColorSpace': 2
+                                 , '$class': archiver._class('NSColor')})
+                 , archiver.encode(datetime(2020, 1, 2))]
+        if text is not None:
+            keys.append('text')
+            values.append(archiver.attributed(text))
+        refs.append(archiver._add({'NS.keys': [archiver.encode(k) for k in keys]
+                           , 'NS.objects': values
+                           , '$class': archiver._class('NSDictionary')}))
+    root = archiver._add({'NS.objects': refs
+                         , '$class': archiver._class('NSArray')})
+    return {'$archiver': 'NSKeyedArchiver', '$version': 100000
+           , '$top': {'root': root}, '$objects': archiver.objects}
+
+def fragmented(x_, name:str, data:bytes, size:int) -> None:
+    """ Store data as skim does attributes too large for one xattr """
+    fragments = [data[i:i + size] for i in range(0, len(data), size)]
+    for i, fragment in enumerate(fragments):
+        x_.set(f'fixture-{i}', fragment)
+    x_.set(name, plistlib.dumps({WRAPPER_KEY: True, UNIQUE_KEY: 'fixture'
+                                , FRAGMENTS_KEY: len(fragments)}
+                                                     , fmt=plistlib.FMT_BINARY))
+
+def binary(value) -> bytes:
+    return plistlib.dumps(value, fmt=plistlib.FMT_BINARY)
+
+# label -> function storing the notes on an xattr object
+FIXTURES = {
+    'plist': lambda x_: x_.set(NOTES_KEY, binary(plain_notes()))
+  , 'plist gzip': lambda x_: x_.set(NOTES_KEY
+                                    , gzip.compress(binary(plain_notes())))
+  , 'keyed archive': lambda x_: x_.set(NOTES_KEY, binary(keyed_notes()))
+  , 'keyed archive bzip2': lambda x_: x_.set(NOTES_KEY
+                                         , bz2.compress(binary(keyed_notes())))
+  , 'keyed archive fragments': lambda x_: fragmented(x_, NOTES_KEY
+                                , gzip.compress(binary(keyed_notes())), 200)
+  , 'text notes': lambda x_: x_.set(TEXT_NOTES_KEY, binary(EXPECTED))
+}
+
+@pytest.fixture
+def pdf(tmp_path):
+    """ An empty pdf, skipping the test where it cannot have xattrs """
+    path = tmp_path / 'paper.pdf'
+    path.touch()
+    try:
+        xattr(path).set('reffer-test', b'')
+    except OSError as e:
+        if e.errno in (errno.ENOTSUP, errno.EOPNOTSUPP):
+            pytest.skip("the file system has no extended attributes")
+        raise
+    return path
+
+@pytest.fixture
+def no_skimnotes(monkeypatch):
+    """ Undecodable notes are then an error instead of left to skimnotes """
+    monkeypatch.setattr(shutil, 'which', lambda name: None)
+
+@pytest.mark.parametrize('store', FIXTURES.values(), ids=FIXTURES.keys())
+def test_formats(pdf, store):
+    store(xattr(pdf))
+    assert text_notes(pdf) == EXPECTED
+
+def test_no_notes(pdf):
+    assert text_notes(pdf) == ''
+
+@pytest.mark.parametrize('data', [
+    bz2.compress(binary(plain_notes()))[:-8]    # truncated
+  , b'BZh9' + bytes(40)                          # not bzip2 after all
+  , gzip.compress(binary(plain_notes()))[:-8]
+  , b'\x1f\x8b\x08\x00' + bytes(40)
+  , b'bplist00 not really'
+  , binary({'$archiver': 'NSKeyedArchiver', '$top': {}, '$objects': []})
+  , binary({'not': 'a list of notes'})
+], ids=['bzip2 truncated', 'bzip2 corrupt', 'gzip truncated', 'gzip corrupt'
+       , 'plist corrupt', 'keyed archive empty', 'not notes'])
+def test_undecodable(pdf, no_skimnotes, data):
+    xattr(pdf).set(NOTES_KEY, data)
+    with pytest.raises(NotesFormatError):
+        text_notes(pdf)
+
+def test_undecodable_text_notes(pdf, no_skimnotes):
+    xattr(pdf).set(TEXT_NOTES_KEY, b'caf\xe9')
+    with pytest.raises(NotesFormatError):
+        text_notes(pdf)
+
+@pytest.mark.parametrize('rtf, text', [
+    (r"{\rtf1\ansi{\fonttbl\f0 Helvetica;}\f0 plain}", "plain")
+  , (r"{\rtf1 caf\'e9\par next\line\tab x}", "caf\u00e9\nnext\n\tx")
+  , (r"{\rtf1 {\*\unknown skipped}kept}", "kept")
+  , (r"{\rtf1 \u8212?dash}", "\u2014dash")          # one fallback character
+  , (r"{\rtf1 \uc2\u8212--dash}", "\u2014dash")
+  , (r"{\rtf1 \uc2\u8212\'97x kept}", "\u2014 kept")
+  , (r"{\rtf1 \uc0\u8212 dash}", "\u2014dash")
+  , (r"{\rtf1 \uc0\u-10178 \u-8724 }", "\U0001f9ec") # a surrogate pair
+  , (r"{\rtf1 \{braces\} back\\slash\~}", "{braces} back\\slash\xa0")
+])
+def test_rtf_to_text(rtf, text):
+    assert rtf_to_text(rtf) == text